@@ -0,0 +1,38 @@
+# Copyright: see copyright.txt
+
+import atexit, gzip, logging, queue, tarfile, threading, time
+
+log = logging.getLogger("ct.archive")
+
+class FormulaArchive:
+    ##########################################################################################
+    # Formulas to be dumped are appended to a gzip-compressed tar file by a background thread,
+    # so that the exploration loop never waits for the file system. Each formula is a member
+    # named "{SMT-id}_{status}.smt2" as before, which can be extracted by extract_formula.py.
+    # Each member is compressed as a gzip member of its own and flushed at once, so that all
+    # formulas written so far are still readable if the run is killed (e.g., by total_timeout).
+    # The end-of-archive blocks are appended when it is closed (also when the program exits).
+    ##########################################################################################
+    def __init__(self, path):
+        self.path = path; self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._write_loop, daemon=True); self.thread.start()
+        atexit.register(self.close)
+
+    def add(self, name, text):
+        if self.thread is not None: self.queue.put((name, text))
+
+    def close(self):
+        if self.thread is not None:
+            self.queue.put(None); self.thread.join(); self.thread = None
+
+    def _write_loop(self):
+        try:
+            with open(self.path, 'wb') as f:
+                while (item := self.queue.get()) is not None:
+                    (name, text) = item; data = text.encode()
+                    info = tarfile.TarInfo(name); info.size = len(data); info.mtime = time.time()
+                    f.write(gzip.compress(info.tobuf() + data + tarfile.NUL * (-len(data) % tarfile.BLOCKSIZE))); f.flush()
+                f.write(gzip.compress(tarfile.NUL * (2 * tarfile.BLOCKSIZE)))
+        except OSError as e:
+            log.warning(f"Cannot write the formula archive {self.path}: {e}")
+            while self.queue.get() is not None: pass # discard the rest so that close() still returns
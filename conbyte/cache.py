@@ -0,0 +1,43 @@
+# Copyright: see copyright.txt
+
+import hashlib, json, logging, os, tempfile
+from conbyte.utils import tokenize_smt
+
+log = logging.getLogger("ct.cache")
+
+class QueryCache:
+    ##########################################################################################
+    # A content-addressed store of solver responses on the local file system. Each entry is a
+    # small JSON file named by the hash of the (normalized) formula and the solver command, so
+    # that different runs, or even different processes running at the same time, can share it.
+    # An entry is always written to a temporary file first and then renamed, which is atomic,
+    # and therefore a reader never sees a partially written entry.
+    ##########################################################################################
+    def __init__(self, directory):
+        self.directory = os.path.abspath(directory)
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def key(cmd, formulas):
+        formulas = " ".join(tokenize_smt(formulas)) # insensitive to whitespaces, except those inside string constants
+        return hashlib.sha256((" ".join(cmd) + "\n" + formulas).encode()).hexdigest()
+
+    def get(self, key): # returns the responses of the solver (as those of SolverSession.query), or None if not found
+        try:
+            with open(self._path(key), 'r') as f: entry = json.load(f)
+            return [entry['status']] + entry['model']
+        except (OSError, ValueError, KeyError, TypeError): return None
+
+    def put(self, key, outputs):
+        path = self._path(key); tmp = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(path), suffix='.tmp', delete=False) as f:
+                tmp = f.name; json.dump({'status': outputs[0], 'model': outputs[1:]}, f)
+            os.replace(tmp, path)
+        except OSError as e:
+            log.warning(f"Cannot write the query cache: {e}")
+            if tmp is not None and os.path.exists(tmp): os.remove(tmp)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.json')
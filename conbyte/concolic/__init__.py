@@ -1,5 +1,7 @@
 # Copyright: see copyright.txt
 
+import sys
+
 class Concolic:
     def __init2__(self, value, expr=None, engine=None): # named __init2__ to be called "manually"
         from conbyte.solver import Solver
@@ -18,6 +20,44 @@ class Concolic:
                     return engine
         return None
 
+class Node(tuple):
+    ##########################################################################################
+    # An immutable expression node, i.e., an operator followed by its arguments, each of which
+    # is a string or another node. Nodes are hash-consed by Node.make(...), so there is at most
+    # one node of each structure in a process: structural equality becomes identity, and a node
+    # is hashed by its identity. The table keys a node by its strings and the ids of its child
+    # nodes (which are kept alive by their parents), so making a node costs only its arity.
+    # A pickled node is interned again when it is loaded in another process.
+    ##########################################################################################
+    __slots__ = ()
+    table = {}
+    threshold = 4096 # the size of the table at which it is pruned next time
+
+    @classmethod
+    def make(cls, *items):
+        key = tuple(id(e) if isinstance(e, Node) else e for e in items) # not "type(e) is str", since "str" here is our submodule conbyte.concolic.str
+        if (node := cls.table.get(key)) is None:
+            if len(cls.table) >= cls.threshold: cls.prune(); cls.threshold = max(2 * len(cls.table), 4096) # amortized O(1) for each node
+            node = cls.table[key] = tuple.__new__(cls, items)
+        return node
+
+    @classmethod
+    def prune(cls):
+        ##########################################################################################
+        # Drop the nodes referred to by nothing but the table, as a WeakValueDictionary would do
+        # (tuples cannot be weakly referenced). Nobody else can compare with such a node, so it is
+        # safe to make a new one later. A parent is always inserted after its children, so in the
+        # reversed order every child is examined after its parents have been dropped.
+        for key in reversed(list(cls.table)):
+            if sys.getrefcount(cls.table[key]) <= 2: del cls.table[key] # referred to by the table and the argument only
+
+    def __eq__(self, other): return self is other
+    def __ne__(self, other): return self is not other
+    __hash__ = object.__hash__
+
+    def __reduce__(self):
+        return (Node.make, tuple(self))
+
 # https://stackoverflow.com/questions/16056574/how-does-python-prevent-a-class-from-being-subclassed/16056691#16056691
 class MetaFinal(type):
     def __new__(cls, name, bases, classdict):
@@ -32,8 +32,12 @@ class Constraint:
 
     def get_all_asserts(self):
         self.processed = True # for debugging purposes
-        asserts = []; tmp = self
-        while tmp.last_predicate is not None: # collect all the assertions in this constraint path
-            asserts.append(tmp.last_predicate)
+        return [c.last_predicate for c in self.get_all_constraints()]
+
+    def get_all_constraints(self):
+        self.processed = True # for debugging purposes
+        constraints = []; tmp = self
+        while tmp.last_predicate is not None: # collect all the constraints (except the root) in this constraint path
+            constraints.append(tmp)
             tmp = self.global_constraints[tmp.parent]
-        return asserts[::-1]
+        return constraints[::-1]
@@ -0,0 +1,120 @@
+# Copyright: see copyright.txt
+
+import functools, re
+from fractions import Fraction
+from conbyte.concolic import Concolic
+from conbyte.utils import smt2py
+
+#########################################################################################
+# This module evaluates our expressions (nested lists of strings and concolic objects, as
+# those walked by Predicate._get_formula, or their frozen forms of nested tuples) under an assignment from variable names (with
+# the suffix '_python') to primitive values, following the semantics of SMT-LIB2 strings
+# and integers. Whenever the result cannot be determined exactly (e.g., an unsupported
+# operator, or an integer divided by zero which is unspecified in SMT-LIB2), we raise
+# NotImplementedError so that the caller can fall back to the solver.
+#########################################################################################
+
+def evaluate(expr, assignment, memo=None):
+    if memo is None: memo = {}
+    if isinstance(expr, Concolic): # Please note that this branch must be placed first!
+        if id(expr) not in memo: memo[id(expr)] = evaluate(expr.expr, assignment, memo)
+        return memo[id(expr)]
+    if isinstance(expr, str):
+        if expr in assignment:
+            value = assignment[expr]
+            return Fraction(value) if type(value) is float else value
+        return _constant(expr)
+    if isinstance(expr, (list, tuple)) and len(expr) > 0:
+        if id(expr) not in memo: memo[id(expr)] = _apply(expr, assignment, memo)
+        return memo[id(expr)]
+    raise NotImplementedError
+
+def evaluate_shallow(expr): # every concolic object in the expression is regarded as its own value (as Predicate.get_formula_shallow)
+    memo = {}; visited = set(); stack = [expr]
+    while stack:
+        e = stack.pop()
+        if isinstance(e, Concolic): memo[id(e)] = _constant(e.value)
+        elif isinstance(e, (list, tuple)) and id(e) not in visited: visited.add(id(e)); stack.extend(e)
+    return evaluate(expr, {}, memo)
+
+@functools.lru_cache(maxsize=None)
+def _constant(expr):
+    if expr in ('true', 'false') or expr.startswith('"'): return smt2py(expr)
+    if re.fullmatch(r"\(- [0-9.]+\)", expr): return -_constant(expr[3:-1])
+    if re.fullmatch(r"[0-9]+", expr): return int(expr)
+    if re.fullmatch(r"[0-9]+\.[0-9]*", expr): return Fraction(expr)
+    raise NotImplementedError # e.g., a variable which is not assigned
+
+def _apply(expr, assignment, memo):
+    op = expr[0]; f = lambda e: evaluate(e, assignment, memo)
+    ######################################################################
+    # Operators whose arguments should not be evaluated all at once first.
+    if op == 'ite': return f(expr[2]) if f(expr[1]) else f(expr[3])
+    if op == 'and': return all(f(e) for e in expr[1:])
+    if op == 'or': return any(f(e) for e in expr[1:])
+    if op in ('str.in.re', 'str.in_re'): return re.fullmatch(_regex(expr[2], assignment, memo), f(expr[1]), re.DOTALL) is not None
+    ######################################################################
+    args = [f(e) for e in expr[1:]]
+    if op == 'not': return not args[0]
+    if op == 'xor': return functools.reduce(lambda a, b: a != b, args)
+    if op == '=>': return functools.reduce(lambda b, a: (not a) or b, reversed(args))
+    if op == '=': return all(a == b for (a, b) in zip(args, args[1:]))
+    if op == 'distinct': return len(set(args)) == len(args)
+    if op == '<': return all(a < b for (a, b) in zip(args, args[1:]))
+    if op == '<=': return all(a <= b for (a, b) in zip(args, args[1:]))
+    if op == '>': return all(a > b for (a, b) in zip(args, args[1:]))
+    if op == '>=': return all(a >= b for (a, b) in zip(args, args[1:]))
+    if op == '+': return sum(args)
+    if op == '-': return -args[0] if len(args) == 1 else functools.reduce(lambda a, b: a - b, args)
+    if op == '*': return functools.reduce(lambda a, b: a * b, args)
+    if op == 'abs': return abs(args[0])
+    if op in ('div', 'mod'): # Euclidean division in SMT-LIB2, i.e., the remainder is always non-negative.
+        if args[1] == 0: raise NotImplementedError
+        r = args[0] % abs(args[1])
+        return r if op == 'mod' else (args[0] - r) // args[1]
+    if op == '/':
+        if args[1] == 0: raise NotImplementedError
+        return Fraction(args[0]) / args[1]
+    if op == 'to_real': return Fraction(args[0])
+    if op == 'to_int': return args[0] // 1 # floor
+    if op == 'is_int': return Fraction(args[0]).denominator == 1
+    if op == 'str.++': return "".join(args)
+    if op == 'str.len': return len(args[0])
+    if op == 'str.at': return args[0][args[1]] if 0 <= args[1] < len(args[0]) else ""
+    if op == 'str.substr':
+        (s, i, n) = args
+        return s[i:i+n] if 0 <= i < len(s) and n > 0 else ""
+    if op == 'str.prefixof': return args[1].startswith(args[0])
+    if op == 'str.suffixof': return args[1].endswith(args[0])
+    if op == 'str.contains': return args[1] in args[0]
+    if op == 'str.indexof':
+        (s, t, i) = args
+        return s.find(t, i) if 0 <= i <= len(s) else -1
+    if op == 'str.replace': return args[0].replace(args[1], args[2], 1)
+    if op in ('str.replaceall', 'str.replace_all'): return args[0].replace(args[1], args[2]) if args[1] else args[0]
+    if op in ('str.to.int', 'str.to_int'): return int(args[0]) if re.fullmatch(r"[0-9]+", args[0]) else -1
+    if op in ('int.to.str', 'str.from_int'): return str(args[0]) if args[0] >= 0 else ""
+    if op == 'str.<': return args[0] < args[1]
+    if op == 'str.<=': return args[0] <= args[1]
+    if op in ('str.is_digit', 'str.is-digit'): return len(args[0]) == 1 and '0' <= args[0] <= '9'
+    if op in ('str.to_code', 'str.to-code'): return ord(args[0]) if len(args[0]) == 1 else -1
+    if op in ('str.from_code', 'str.from-code'): return chr(args[0]) if 0 <= args[0] <= 0x2ffff else ""
+    raise NotImplementedError
+
+def _regex(expr, assignment, memo): # translate the regular expression into that of Python
+    op = expr[0] if isinstance(expr, (list, tuple)) else expr
+    if op in ('re.allchar', 're.all', 're.none', 're.nostr'):
+        return {'re.allchar': '.', 're.all': '.*', 're.none': '(?!)', 're.nostr': '(?!)'}[op]
+    args = expr[1:]
+    if op in ('str.to.re', 'str.to_re'): return re.escape(evaluate(args[0], assignment, memo))
+    if op == 're.range':
+        (a, b) = (evaluate(args[0], assignment, memo), evaluate(args[1], assignment, memo))
+        if len(a) != 1 or len(b) != 1 or a > b: return '(?!)' # In SMT-LIB2, such a range is an empty language.
+        return f'[\\U{ord(a):08x}-\\U{ord(b):08x}]'
+    args = [_regex(e, assignment, memo) for e in args]
+    if op == 're.+': return f'(?:{args[0]})+'
+    if op == 're.*': return f'(?:{args[0]})*'
+    if op == 're.opt': return f'(?:{args[0]})?'
+    if op == 're.union': return '(?:' + '|'.join(args) + ')'
+    if op == 're.++': return ''.join(f'(?:{a})' for a in args)
+    raise NotImplementedError
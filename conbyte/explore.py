@@ -1,8 +1,10 @@
-import builtins, coverage, func_timeout, inspect, logging, multiprocessing, os, pickle, sys, traceback
+import builtins, coverage, func_timeout, inspect, io, logging, multiprocessing, os, pickle, sys, time, traceback
 from conbyte.constraint import Constraint
 from conbyte.path import PathToConstraint
 from conbyte.solver import Solver
+from conbyte.tracer import LineTracer
 from conbyte.utils import ConcolicObject, unwrap, get_module_from_rootdir_and_modpath, get_function_from_module_and_funcname
+from conbyte.zygote import Zygote
 
 log = logging.getLogger("ct.explore")
 sys.setrecursionlimit(1000000) # The original limit is not enough in some special cases.
@@ -29,10 +31,10 @@ class ExplorationEngine:
     class Unpicklable(metaclass=type('', (type,), {"__repr__": lambda self: '<UNPICKLABLE>'})): pass # indicate that an object is unpicklable
     class LazyLoading(metaclass=type('', (type,), {"__repr__": lambda self: '<DEFAULT>'})): pass # lazily loading default values of primitive arguments
 
-    def __init__(self, *, solver='cvc4', timeout=10, safety=0, store=None, verbose=1, logfile=None, statsdir=None):
+    def __init__(self, *, solver='cvc4', timeout=10, safety=0, store=None, verbose=1, logfile=None, statsdir=None, share_prefix=False, solver_jobs=1, query_cache=None, portfolio=None):
         self.__init2__(); self.statsdir = statsdir
         if self.statsdir: os.system(f"rm -rf '{statsdir}'"); os.system(f"mkdir -p '{statsdir}'")
-        Solver.set_basic_configurations(solver, timeout, safety, store, statsdir)
+        Solver.set_basic_configurations(solver, timeout, safety, store, statsdir, share_prefix, solver_jobs, query_cache, portfolio)
         ############################################################
         # This section mainly deals with the logging settings.
         log_level = 25 - 5 * verbose
@@ -63,26 +65,45 @@ class ExplorationEngine:
         self.coverage_data = coverage.CoverageData()
         self.coverage_accumulated_missing_lines = {}
         self.var_to_types = {}
+        self.model_cache = [] # every executed input (which includes every new model), used before calling the solver
+        self.unsat_assertions = {} # an assertion -> sets of assertions (containing it) which are known to be unsat
+        self.constraint_inputs = {} # a Constraint id -> the input which generated this constraint (only in the parent process)
+        self.constraint_retries = {} # a Constraint id -> the number of times it has been requeued after exceeding its time limit
 
     def _execution_loop(self, max_iterations, all_args):
         tried_input_args = [all_args.copy()] # .copy() is important!!
         iterations = 1; cont = self._one_execution(all_args) # the 1st execution
+        self.model_cache.append(all_args.copy())
         while cont and iterations < max_iterations and len(self.constraints_to_solve) > 0:
             ##############################################################
             # In each iteration, we take one constraint out of the queue
             # and try to solve for it. After that we'll obtain a model as
             # a list of arguments and continue the next iteration with it.
-            constraint = self.constraints_to_solve.pop(0)
-            model = Solver.find_model_from_constraint(self, constraint)
+            # With several solver jobs, the first few constraints are taken
+            # and solved at once, and their models are used in this order.
+            # A batch never exceeds the remaining iterations, and those
+            # left unused when the execution stops are put back in queue.
+            constraints = [self._pop_constraint() for _ in range(min(Solver.jobs, len(self.constraints_to_solve), max_iterations - iterations))]
+            models = Solver.find_models_from_constraints(self, constraints)
             ##############################################################
-            if model is not None:
-                all_args.update(model) # from model to argument
-                if all_args not in tried_input_args:
-                    tried_input_args.append(all_args.copy()) # .copy() is important!!
-                    log.info(f"=== Iterations: {iterations} ==="); iterations += 1
-                    cont = self._one_execution(all_args) # other consecutive executions following the 1st execution
+            for (i, model) in enumerate(models):
+                if not cont or iterations >= max_iterations:
+                    self.constraints_to_solve.extend(c for (c, m) in zip(constraints[i:], models[i:]) if m is not None); break # the others have been requeued or are never solvable
+                if model is not None:
+                    all_args.update(model) # from model to argument
+                    if all_args not in tried_input_args:
+                        tried_input_args.append(all_args.copy()) # .copy() is important!!
+                        log.info(f"=== Iterations: {iterations} ==="); iterations += 1
+                        cont = self._one_execution(all_args) # other consecutive executions following the 1st execution
+                        self.model_cache.append(all_args.copy())
         return iterations
 
+    def _pop_constraint(self):
+        # The constraints retried fewer times are taken first, and then those with shorter paths, which are
+        # cheaper and more likely to be satisfiable. The queue order is kept among the remaining ties.
+        i = min(range(len(self.constraints_to_solve)), key=lambda i: (self.constraint_retries.get(self.constraints_to_solve[i].id, 0), self.constraints_to_solve[i].height, i))
+        return self.constraints_to_solve.pop(i)
+
     def _can_use_concolic_wrapper(self, root, modpath):
         r, s = multiprocessing.Pipe()
         if os.fork() == 0: # child process
@@ -97,13 +118,15 @@ class ExplorationEngine:
         ans = r.recv(); r.close(); s.close()
         return ans
 
-    def explore(self, modpath, all_args={}, /, *, root='.', funcname=None, max_iterations=200, single_timeout=15, total_timeout=900, deadcode=set(), include_exception=False, lib=None, single_coverage=True):
-        self.modpath = modpath; self.funcname = funcname; self.single_timeout = single_timeout; self.total_timeout = total_timeout; self.include_exception = include_exception; self.deadcode = deadcode; self.lib = lib
+    def explore(self, modpath, all_args={}, /, *, root='.', funcname=None, max_iterations=200, single_timeout=15, total_timeout=900, deadcode=set(), include_exception=False, lib=None, single_coverage=True, zygote=False, single_pass=False, cross_check=0):
+        self.start_time = time.time(); self.modpath = modpath; self.funcname = funcname; self.single_timeout = single_timeout; self.total_timeout = total_timeout; self.include_exception = include_exception; self.deadcode = deadcode; self.lib = lib
         if self.funcname is None: self.funcname = self.modpath.split('.')[-1]
         self.__init2__(); self.root = os.path.abspath(root); self.target_file = self.root + '/' + self.modpath.replace('.', '/') + '.py'
         self.single_coverage = single_coverage
+        self.single_pass = single_pass and single_coverage; self.cross_check = cross_check # only meaningful when the target file is the only one measured
         if self.single_coverage:
             self.coverage = coverage.Coverage(data_file=None, include=[self.target_file])
+            if self.single_pass: self.target_statements = set(coverage.Coverage(data_file=None).analysis(self.target_file)[1]) # by another object, which keeps the engine picklable
         else:
             self.coverage = coverage.Coverage(data_file=None, source=[self.root], omit=['**/__pycache__/**', '**/.venv/**'])
         if self.lib: sys.path.insert(0, os.path.abspath(self.lib))
@@ -111,11 +134,16 @@ class ExplorationEngine:
         file_dir = os.path.abspath(os.path.dirname(os.path.join(self.root, self.modpath.replace('.', '/') + '.py')))
         now_dir = os.getcwd(); os.chdir(file_dir)
         self.can_use_concolic_wrapper = self._can_use_concolic_wrapper(self.root, self.modpath)
+        ##########################################################################################
+        # In the zygote mode, the target module is imported only once for each mode, and then each
+        # execution takes place in a child forked from the corresponding zygote.
+        self.zygotes = {'concolic': Zygote(self._prepare_concolic, self._serve_concolic, self._update_concolic), 'primitive': Zygote(self._prepare_primitive, self._serve_primitive)} if zygote else None
         try: iterations = func_timeout.func_timeout(self.total_timeout, self._execution_loop, args=(max_iterations, all_args))
         except BaseException as e: # importantly note that func_timeout.FunctionTimedOut is NOT inherited from the (general) Exception class.
             print('Was this exception triggered by total_timeout? ' + str(e))
             iterations = 0 # usually catches timeout exceptions
             # traceback.print_exc()
+        for z in (self.zygotes or {}).values(): z.close()
         os.chdir(now_dir); del sys.path[0]
         if self.lib: del sys.path[0]
         if self.statsdir:
@@ -130,6 +158,12 @@ class ExplorationEngine:
                 f.write(f'sat,{Solver.stats["sat_number"]},{Solver.stats["sat_time"]}\n')
                 f.write(f'unsat,{Solver.stats["unsat_number"]},{Solver.stats["unsat_time"]}\n')
                 f.write(f'otherwise,{Solver.stats["otherwise_number"]},{Solver.stats["otherwise_time"]}\n')
+                f.write(f'retry,{Solver.stats["retry_number"]},{Solver.stats["retry_time"]}\n') # attempts interrupted by a short time limit, whose constraints are requeued (and counted above once finished)
+                f.write(f'skipped,{Solver.stats["skipped_number"]},0\n') # constraints not solved since they are known to be unsat
+                f.write(f'cache,{Solver.stats["cache_number"]},{Solver.stats["cache_time"]}\n') # constraints (also counted above) whose answers are found in the query cache
+                f.write(f'native,{Solver.stats["native_number"]},{Solver.stats["native_time"]}\n') # constraints (also counted above) decided without the external solver
+                if len(Solver.portfolio) > 1: # constraints (also counted above) answered first by each configuration of the portfolio
+                    for (i, config) in enumerate(Solver.portfolio): f.write(f'"portfolio {config}",{Solver.stats["portfolio_number"][i]},{Solver.stats["portfolio_time"][i]}\n')
         return iterations - 1
 
     def _one_execution(self, all_args):
@@ -137,10 +171,18 @@ class ExplorationEngine:
         if not self.single_coverage: # We don't measure coverage in the primitive mode under the non-single coverage setting.
             self.in_out.append((all_args.copy(), result)) # .copy() is important! Think why.
             return True # continue iteration
-        answer = self._one_execution_primitive(all_args) # we must measure the coverage in the primitive mode since self.constraints_to_solve would become unpicklable if measured in the concolic mode
-        if self.Timeout not in (result, answer):
-            if result != answer: print('Input:', all_args, '／My result:', result, '／Correct answer:', answer)
-            assert result == answer
+        ##########################################################################################
+        # In the single-pass mode, the lines executed by the concolic run have been measured by our
+        # own tracer (since self.constraints_to_solve would become unpicklable if measured by the
+        # "coverage" module in the concolic mode), so the primitive mode is only run every N-th
+        # execution (if N > 0) to cross-check the result of the concolic run.
+        if self.single_pass and (self.cross_check <= 0 or len(self.in_out) % self.cross_check):
+            self.in_out.append((all_args.copy(), result))
+        else:
+            answer = self._one_execution_primitive(all_args) # we must measure the coverage in the primitive mode since self.constraints_to_solve would become unpicklable if measured in the concolic mode
+            if self.Timeout not in (result, answer):
+                if result != answer: print('Input:', all_args, '／My result:', result, '／Correct answer:', answer)
+                assert result == answer
         # Note only in the self.single_coverage mode does the program go here.
         s = (self.function_lines_range - self.deadcode) & self.coverage_accumulated_missing_lines[self.target_file]
         log.info(f"Not Covered Yet: {self.target_file} {sorted(s) if s else '{}'}")
@@ -148,39 +190,15 @@ class ExplorationEngine:
 
     def _one_execution_concolic(self, all_args):
         r1, s1 = multiprocessing.Pipe(); r2, s2 = multiprocessing.Pipe(); r3, s3 = multiprocessing.Pipe(); r0, s0 = multiprocessing.Pipe()
-        def child_process():
-            sys.dont_write_bytecode = True # very important to prevent the later primitive mode from using concolic objects imported here...
-            prepare(); self.path.__init__(); log.info("Inputs: " + str(all_args))
-            if self.can_use_concolic_wrapper:
-                import conbyte.wrapper
-            else:
-                import conbyte
-            module = get_module_from_rootdir_and_modpath(self.root, self.modpath)
-            execute = get_function_from_module_and_funcname(module, self.funcname)
-            ccc_args, ccc_kwargs = self._get_concolic_arguments(execute, all_args) # primitive input arguments "all_args" may be modified here.
-            s1.send((all_args, self.var_to_types)); result = self.Exception
-            try:
-                result = conbyte.utils.unwrap(func_timeout.func_timeout(self.single_timeout, execute, args=ccc_args, kwargs=ccc_kwargs))
-                log.info(f"Return: {result}")
-            except func_timeout.FunctionTimedOut:
-                result = self.Timeout
-                log.error(f"Timeout (soft) for: {all_args} >> ./py-conbyte.py -r '{self.root}' '{self.modpath}' -s {self.funcname} {{}} --lib '{self.lib}' --include_exception")#; traceback.print_exc()
-                if self.statsdir:
-                    with open(self.statsdir + '/exception.txt', 'a') as f:
-                        print(f"Timeout (soft) for: {all_args} >> ./py-conbyte.py -r '{self.root}' '{self.modpath}' -s {self.funcname} {{}} --lib '{self.lib}' --include_exception", file=f)
-            except Exception as e:
-                log.error(f"Exception for: {all_args} >> ./py-conbyte.py -r '{self.root}' '{self.modpath}' -s {self.funcname} {{}} -m 20 --lib '{self.lib}' --include_exception")#; log.error(e); traceback.print_exc()
-                if self.statsdir:
-                    with open(self.statsdir + '/exception.txt', 'a') as f:
-                        print(f"Exception for: {all_args} >> ./py-conbyte.py -r '{self.root}' '{self.modpath}' -s {self.funcname} {{}} -m 20 --lib '{self.lib}' --include_exception", file=f); print(e, file=f)
-            ###################################### Communication Section ######################################
-            s0.send(0) # just a notification to the parent process that we're going to send data
-            try: s2.send(result)
-            except: s2.send(self.Unpicklable)
-            try: s3.send((Constraint.global_constraints, self.constraints_to_solve, self.path))
-            except: s3.send(self.Unpicklable) # may fail if they contain some unpicklable objects
-        process = multiprocessing.Process(target=child_process); process.start()
-        (all_args2, self.var_to_types) = r1.recv(); r1.close(); s1.close(); all_args.clear(); all_args.update(all_args2) # update the parameter directly
+        if self.zygotes: # The zygote only needs the nodes which have been added to the tree since the previous request.
+            if not (zygote := self.zygotes['concolic']).is_alive(): zygote.start(); self.zygote_nodes = len(Constraint.global_constraints)
+            delta = (Constraint.global_constraints[self.zygote_nodes:], [c.id for c in self.constraints_to_solve], self.var_to_types); self.zygote_nodes = len(Constraint.global_constraints)
+            process = zygote.fork((all_args, self._dumps(delta)), [s0, s1, s2, s3])
+        else:
+            process = multiprocessing.Process(target=self._concolic_child, args=(None, all_args, s0, s1, s2, s3)); process.start()
+        (all_args2, self.var_to_types) = r1.recv(); all_args.clear(); all_args.update(all_args2) # update the parameter directly
+        if self.single_pass: self.module_lines_range = r1.recv(); self.function_lines_range = r1.recv()
+        r1.close(); s1.close()
         if not r0.poll(self.single_timeout + 5):
             result = self.Timeout
             log.error(f"Timeout (hard) for: {all_args} >> ./py-conbyte.py -r '{self.root}' '{self.modpath}' -s {self.funcname} {{}} --lib '{self.lib}' --include_exception")
@@ -189,42 +207,105 @@ class ExplorationEngine:
                     print(f"Timeout (hard) for: {all_args} >> ./py-conbyte.py -r '{self.root}' '{self.modpath}' -s {self.funcname} {{}} --lib '{self.lib}' --include_exception", file=f)
         else:
             result = r2.recv()
-            if (t:=r3.recv()) is not self.Unpicklable: (Constraint.global_constraints, self.constraints_to_solve, self.path) = t
+            if self.single_pass and (lines := r2.recv()) is not None: self._update_coverage(lines)
+            if (t:=self._loads(r3.recv_bytes())) is not self.Unpicklable:
+                (nodes, queued) = t; self._merge_constraints(nodes); args = all_args.copy()
+                for i in queued: self.constraints_to_solve.append(Constraint.global_constraints[i]); self.constraint_inputs.setdefault(i, args)
+        if self.single_pass and self.target_file not in self.coverage_accumulated_missing_lines: self.coverage_accumulated_missing_lines[self.target_file] = self.module_lines_range
         r2.close(); s2.close(); r3.close(); s3.close(); r0.close(); s0.close()
         if process.is_alive(): process.kill()
         return result
 
+    def _prepare_concolic(self): # imports the target module for the concolic mode
+        sys.dont_write_bytecode = True # very important to prevent the later primitive mode from using concolic objects imported here...
+        prepare()
+        if self.can_use_concolic_wrapper:
+            import conbyte.wrapper
+        else:
+            import conbyte
+        if not self.single_pass: return get_module_from_rootdir_and_modpath(self.root, self.modpath)
+        tracer = LineTracer(self.target_file); tracer.start() # The lines executed during the import are also covered.
+        try: return get_module_from_rootdir_and_modpath(self.root, self.modpath)
+        finally: tracer.stop(); self.imported_lines = tracer.lines
+
+    def _update_concolic(self, module, request): # runs in the zygote, which keeps its own copy of the tree
+        (nodes, queued, self.var_to_types) = self._loads(request[1]); self._merge_constraints(nodes)
+        self.constraints_to_solve = [Constraint.global_constraints[i] for i in queued]
+
+    def _serve_concolic(self, module, request, conns): # runs in the child forked by the zygote
+        self._concolic_child(module, request[0], *conns)
+
+    def _concolic_child(self, module, all_args, s0, s1, s2, s3):
+        self.path.__init__(); log.info("Inputs: " + str(all_args))
+        nodes = len(Constraint.global_constraints); queued = len(self.constraints_to_solve) # Only what is added after this point is sent back.
+        if module is None: module = self._prepare_concolic()
+        execute = get_function_from_module_and_funcname(module, self.funcname)
+        ccc_args, ccc_kwargs = self._get_concolic_arguments(execute, all_args) # primitive input arguments "all_args" may be modified here.
+        s1.send((all_args, self.var_to_types)); result = self.Exception
+        if self.single_pass: # the same as those sent in the primitive mode
+            s1.send(self.target_statements & set(range(1, 1+len(inspect.getsourcelines(module)[0]))))
+            s1.send(self.target_statements & set(range(inspect.getsourcelines(execute)[1], inspect.getsourcelines(execute)[1] + len(inspect.getsourcelines(execute)[0]))))
+            tracer = LineTracer(self.target_file); tracer.start()
+        try:
+            try: result = unwrap(func_timeout.func_timeout(self.single_timeout, execute, args=ccc_args, kwargs=ccc_kwargs))
+            finally:
+                if self.single_pass: tracer.stop()
+            log.info(f"Return: {result}")
+        except func_timeout.FunctionTimedOut:
+            result = self.Timeout
+            log.error(f"Timeout (soft) for: {all_args} >> ./py-conbyte.py -r '{self.root}' '{self.modpath}' -s {self.funcname} {{}} --lib '{self.lib}' --include_exception")#; traceback.print_exc()
+            if self.statsdir:
+                with open(self.statsdir + '/exception.txt', 'a') as f:
+                    print(f"Timeout (soft) for: {all_args} >> ./py-conbyte.py -r '{self.root}' '{self.modpath}' -s {self.funcname} {{}} --lib '{self.lib}' --include_exception", file=f)
+        except Exception as e:
+            log.error(f"Exception for: {all_args} >> ./py-conbyte.py -r '{self.root}' '{self.modpath}' -s {self.funcname} {{}} -m 20 --lib '{self.lib}' --include_exception")#; log.error(e); traceback.print_exc()
+            if self.statsdir:
+                with open(self.statsdir + '/exception.txt', 'a') as f:
+                    print(f"Exception for: {all_args} >> ./py-conbyte.py -r '{self.root}' '{self.modpath}' -s {self.funcname} {{}} -m 20 --lib '{self.lib}' --include_exception", file=f); print(e, file=f)
+        ###################################### Communication Section ######################################
+        s0.send(0) # just a notification to the parent process that we're going to send data
+        try: s2.send(result)
+        except: s2.send(self.Unpicklable)
+        if self.single_pass: s2.send(self.imported_lines | tracer.lines if self.include_exception or (result is not self.Exception) else None)
+        try: s3.send_bytes(self._dumps((Constraint.global_constraints[nodes:], [c.id for c in self.constraints_to_solve[queued:]])))
+        except: s3.send_bytes(self._dumps(self.Unpicklable)) # may fail if they contain some unpicklable objects
+
+    ##########################################################################################
+    # The constraint tree is only exchanged in deltas between processes: the new nodes (whose
+    # parents and children are referred to by ids) and the ids of the queued ones. Predicates are
+    # already frozen free of concolic objects (see PathToConstraint.add_branch), and any other
+    # reference to the engine is not pickled along either, but replaced by that of the receiver.
+    def _dumps(self, obj):
+        f = io.BytesIO(); pickler = pickle.Pickler(f, pickle.HIGHEST_PROTOCOL)
+        pickler.persistent_id = lambda o: 'engine' if o is self else None
+        pickler.dump(obj); return f.getvalue()
+
+    def _loads(self, data):
+        unpickler = pickle.Unpickler(io.BytesIO(data)); unpickler.persistent_load = lambda pid: self
+        return unpickler.load()
+
+    @staticmethod
+    def _merge_constraints(nodes): # appends the new nodes (created in another process) to the tree of this process
+        if not nodes: return
+        for c in nodes:
+            assert c.id == len(Constraint.global_constraints)
+            Constraint.global_constraints.append(c)
+            if c.parent < nodes[0].id: Constraint.global_constraints[c.parent].children.append(c.id) # The new parents already know their children.
+
+    def _update_coverage(self, lines): # merges the lines executed by a concolic run into the coverage of the target file
+        self.coverage_data.add_lines({self.target_file: dict.fromkeys(lines)})
+        missing_lines = self.target_statements - lines
+        if self.target_file not in self.coverage_accumulated_missing_lines:
+            self.coverage_accumulated_missing_lines[self.target_file] = missing_lines
+        else:
+            self.coverage_accumulated_missing_lines[self.target_file] &= missing_lines
+
     def _one_execution_primitive(self, all_args):
         r1, s1 = multiprocessing.Pipe(); r2, s2 = multiprocessing.Pipe(); r0, s0 = multiprocessing.Pipe()
-        def child_process():
-            sys.dont_write_bytecode = True # same reason mentioned in the concolic mode
-            self.coverage.start()
-            module = get_module_from_rootdir_and_modpath(self.root, self.modpath)
-            execute = get_function_from_module_and_funcname(module, self.funcname)
-            s1.send(set(self.coverage.analysis(self.target_file)[1]) & set(range(1, 1+len(inspect.getsourcelines(module)[0])))) # Note inspect.getsourcelines(module)[1] always returns 0, which is not the fact.
-            s1.send(set(self.coverage.analysis(self.target_file)[1]) & set(range(inspect.getsourcelines(execute)[1], inspect.getsourcelines(execute)[1] + len(inspect.getsourcelines(execute)[0]))))
-            pri_args, pri_kwargs = self._complete_primitive_arguments(execute, all_args)
-            answer = self.Exception
-            try:
-                answer = func_timeout.func_timeout(self.single_timeout, execute, args=pri_args, kwargs=pri_kwargs)
-            except func_timeout.FunctionTimedOut: answer = self.Timeout
-            except: pass
-            self.coverage.stop(); self.coverage_data.update(self.coverage.get_data())
-            for file in self.coverage_data.measured_files(): # "file" is absolute here.
-                _, _, missing_lines, _ = self.coverage.analysis(file)
-                if file not in self.coverage_accumulated_missing_lines:
-                    self.coverage_accumulated_missing_lines[file] = set(missing_lines)
-                else:
-                    self.coverage_accumulated_missing_lines[file] &= set(missing_lines)
-            ###################################### Communication Section ######################################
-            s0.send(0) # just a notification to the parent process that we're going to send data
-            try: s1.send(answer)
-            except: answer = self.Unpicklable; s1.send(answer)
-            if self.include_exception or (answer is not self.Exception):
-                s2.send((self.coverage_data, self.coverage_accumulated_missing_lines))
-            else:
-                s2.send(self.Exception)
-        process = multiprocessing.Process(target=child_process); process.start()
+        if self.zygotes: # The child forked by the zygote needs the current coverage data.
+            process = self.zygotes['primitive'].fork((all_args, (self.coverage_data, self.coverage_accumulated_missing_lines)), [s0, s1, s2])
+        else:
+            process = multiprocessing.Process(target=self._primitive_child, args=(None, all_args, s0, s1, s2)); process.start()
         self.module_lines_range = r1.recv(); self.function_lines_range = r1.recv()
         if not r0.poll(self.single_timeout + 5): answer = self.Timeout
         else:
@@ -235,6 +316,42 @@ class ExplorationEngine:
         if process.is_alive(): process.kill()
         return answer
 
+    def _prepare_primitive(self): # imports the target module for the primitive mode
+        sys.dont_write_bytecode = True # same reason mentioned in the concolic mode
+        self.coverage.start() # The lines executed during the import are also covered.
+        return get_module_from_rootdir_and_modpath(self.root, self.modpath)
+
+    def _serve_primitive(self, module, request, conns): # runs in the child forked by the zygote
+        (all_args, (self.coverage_data, self.coverage_accumulated_missing_lines)) = request
+        self._primitive_child(module, all_args, *conns)
+
+    def _primitive_child(self, module, all_args, s0, s1, s2):
+        if module is None: module = self._prepare_primitive()
+        execute = get_function_from_module_and_funcname(module, self.funcname)
+        s1.send(set(self.coverage.analysis(self.target_file)[1]) & set(range(1, 1+len(inspect.getsourcelines(module)[0])))) # Note inspect.getsourcelines(module)[1] always returns 0, which is not the fact.
+        s1.send(set(self.coverage.analysis(self.target_file)[1]) & set(range(inspect.getsourcelines(execute)[1], inspect.getsourcelines(execute)[1] + len(inspect.getsourcelines(execute)[0]))))
+        pri_args, pri_kwargs = self._complete_primitive_arguments(execute, all_args)
+        answer = self.Exception
+        try:
+            answer = func_timeout.func_timeout(self.single_timeout, execute, args=pri_args, kwargs=pri_kwargs)
+        except func_timeout.FunctionTimedOut: answer = self.Timeout
+        except: pass
+        self.coverage.stop(); self.coverage_data.update(self.coverage.get_data())
+        for file in self.coverage_data.measured_files(): # "file" is absolute here.
+            _, _, missing_lines, _ = self.coverage.analysis(file)
+            if file not in self.coverage_accumulated_missing_lines:
+                self.coverage_accumulated_missing_lines[file] = set(missing_lines)
+            else:
+                self.coverage_accumulated_missing_lines[file] &= set(missing_lines)
+        ###################################### Communication Section ######################################
+        s0.send(0) # just a notification to the parent process that we're going to send data
+        try: s1.send(answer)
+        except: answer = self.Unpicklable; s1.send(answer)
+        if self.include_exception or (answer is not self.Exception):
+            s2.send((self.coverage_data, self.coverage_accumulated_missing_lines))
+        else:
+            s2.send(self.Exception)
+
     @classmethod
     def _complete_primitive_arguments(cls, func, all_args):
         prim_args = []; prim_kwargs = {}
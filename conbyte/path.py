@@ -16,11 +16,17 @@ class PathToConstraint:
         self.current_constraint = self.root_constraint
 
     def add_branch(self, conbool):
-        p = Predicate(conbool.expr, unwrap(conbool))
+        expr = Predicate.simplify(conbool.expr)
+        if Predicate.is_constant(expr): # This branch cannot be flipped, so there is no need to record it.
+            log.smtlib2(f"Skip constant branch: {Predicate.get_formula_dag(conbool.expr)} = {unwrap(conbool)}"); return
+        frozen = Predicate.freeze(expr) # Predicates never refer to concolic objects (nor the engine), so they are cheap to keep and to ship.
+        p = Predicate(frozen, unwrap(conbool))
         c = self.current_constraint.find_child(p)
-        pneg = Predicate(conbool.expr, not unwrap(conbool))
+        pneg = Predicate(frozen, not unwrap(conbool))
         cneg = self.current_constraint.find_child(pneg)
         if c is None and cneg is None:
+            p.formula = pneg.formula = Predicate.get_formula_dag(expr) # rendered from the live expression, whose concolic objects cache the texts of subterms
+            p.variables = pneg.variables = p.get_variables()
             c = self.current_constraint.add_child(p); c.processed = True # for debugging purposes
             cneg = self.current_constraint.add_child(pneg)
             conbool.engine.constraints_to_solve.append(cneg) # add the negated constraint to the queue for later traversal
@@ -1,6 +1,8 @@
 # Copyright: see copyright.txt
 
-from conbyte.concolic import Concolic
+from conbyte.concolic import Concolic, Node
+from conbyte.evaluator import evaluate
+from conbyte.utils import py2smt
 
 class Predicate:
     def __init__(self, expr, value):
@@ -15,15 +17,99 @@ class Predicate:
     def _eq_worker(self, expr1, expr2):
         if isinstance(expr1, Concolic) and isinstance(expr2, Concolic):
             return self._eq_worker(expr1.expr, expr2.expr)
-        if isinstance(expr1, list) and isinstance(expr2, list) and len(expr1) == len(expr2):
+        if isinstance(expr1, Node) or isinstance(expr2, Node): return expr1 is expr2 # frozen nodes are interned
+        if isinstance(expr1, (list, tuple)) and isinstance(expr2, (list, tuple)) and len(expr1) == len(expr2):
             return next((False for (e1, e2) in zip(expr1, expr2) if not self._eq_worker(e1, e2)), True)
         return expr1 == expr2
 
+    def get_variables(self):
+        if not hasattr(self, 'variables'): # computed only once
+            self.variables = set(); visited = set(); stack = [self.expr]
+            while stack: # Please note that the expression may be a DAG, so we must not visit any node twice.
+                expr = stack.pop()
+                if isinstance(expr, (Concolic, list, tuple)):
+                    if id(expr) in visited: continue
+                    visited.add(id(expr)); stack.extend([expr.expr] if isinstance(expr, Concolic) else expr)
+                elif isinstance(expr, str) and expr.endswith('_python') and not expr.startswith('"'): # '_python' is used to avoid name collision
+                    self.variables.add(expr)
+        return self.variables
+
+    @staticmethod
+    def simplify(expr, memo=None):
+        ##########################################################################################
+        # Rewrite the expression bottom-up by folding constant subterms (with our evaluator) and by
+        # removing trivial patterns, e.g., (ite true a b) -> a, (+ x 0) -> x, (str.++ x "") -> x.
+        # An unchanged subterm is returned as the same object, so that the sharing of subterms and
+        # the cache in concolic objects are preserved. The result of a concolic object is cached in
+        # itself since it does not depend on the context.
+        if memo is None: memo = {}
+        if isinstance(expr, Concolic):
+            if '_simplified' not in expr.__dict__:
+                e = Predicate.simplify(expr.expr, memo); expr._simplified = expr if e is expr.expr else e
+            return expr._simplified
+        if not isinstance(expr, list) or len(expr) == 0: return expr
+        if id(expr) not in memo:
+            args = [Predicate.simplify(e, memo) for e in expr]
+            memo[id(expr)] = Predicate._simplify_node(expr if all(a is e for (a, e) in zip(args, expr)) else args)
+        return memo[id(expr)]
+
+    @staticmethod
+    def freeze(expr, memo=None):
+        ##########################################################################################
+        # Convert the expression into interned nodes of strings (see Node), where each concolic
+        # object is replaced by the frozen form of its expression. The result no longer refers to
+        # any concolic object (nor therefore to the engine), so it is cheap to keep and to pickle,
+        # and two frozen expressions are equal iff they are the same node. The result of a concolic
+        # object is cached in itself, so that the subterms shared by the branches of a run are
+        # converted only once.
+        if memo is None: memo = {}
+        if isinstance(expr, Concolic):
+            if '_frozen' not in expr.__dict__: expr._frozen = Predicate.freeze(expr.expr, memo)
+            return expr._frozen
+        if not isinstance(expr, list): return expr
+        if id(expr) not in memo: memo[id(expr)] = Node.make(*(Predicate.freeze(e, memo) for e in expr))
+        return memo[id(expr)]
+
+    @staticmethod
+    def is_constant(expr): # whether the expression is a leaf which is not a variable
+        while isinstance(expr, Concolic): expr = expr.expr
+        return isinstance(expr, str) and (expr.startswith('"') or not expr.endswith('_python')) # '_python' is used to avoid name collision
+
+    @staticmethod
+    def _simplify_node(expr):
+        def inner(e):
+            while isinstance(e, Concolic): e = e.expr
+            return e
+        leaf = lambda e: e if isinstance(e := inner(e), str) else None
+        (op, args) = (expr[0], expr[1:])
+        if not isinstance(op, str): return expr
+        if all(Predicate.is_constant(a) for a in args) or (op in ('str.in.re', 'str.in_re') and Predicate.is_constant(args[0]) and not Predicate(args[1], None).get_variables()):
+            try:
+                if type(value := evaluate(expr, {})) in (bool, int, str): return py2smt(value)
+            except Exception: pass # e.g., an unsupported operator, or some argument is of the regular expression type
+            return expr
+        if op == 'ite' and leaf(args[0]) in ('true', 'false'): return args[1] if leaf(args[0]) == 'true' else args[2]
+        if op == 'not' and isinstance(e := inner(args[0]), list) and e[0] == 'not': return e[1]
+        unit = {'and': 'true', 'or': 'false', '+': '0', '*': '1', 'str.++': py2smt('')}.get(op)
+        if op == 'and' and 'false' in map(leaf, args): return 'false'
+        if op == 'or' and 'true' in map(leaf, args): return 'true'
+        if unit is not None:
+            args = [a for a in args if leaf(a) != unit]
+            if len(args) == 0: return unit
+            if len(args) == 1: return args[0]
+            return expr if len(args) == len(expr) - 1 else [op] + args
+        if op == '-' and len(args) == 2 and leaf(args[1]) == '0': return args[0]
+        return expr
+
     def get_formula(self):
-        formula = self.get_formula_deep(self.expr)
+        formula = self.get_formula_of_expr()
         if not self.value: formula = "(not " + formula + ")"
         return "(assert " + formula + ")"
 
+    def get_formula_of_expr(self):
+        if not hasattr(self, 'formula'): self.formula = self.get_formula_dag(self.expr) # computed only once, and also pickled along
+        return self.formula
+
     @staticmethod
     def get_formula_deep(expr):
         return Predicate._get_formula(expr, True)
@@ -32,15 +118,57 @@ class Predicate:
     def get_formula_shallow(expr):
         return Predicate._get_formula(expr, False)
 
+    @staticmethod
+    def get_formula_dag(expr):
+        ##########################################################################################
+        # The same as get_formula_deep(...) except that a subterm reached through more than one path
+        # (i.e., the same list or tuple object) is printed only once, bound to a name by "let", and the name
+        # is used everywhere instead. Since the bindings are ordered from the innermost subterms,
+        # each of them may refer to those before it.
+        # Moreover, the text of a subterm using no "let" names does not depend on its context, so
+        # it is cached in its concolic objects, and we do not even walk into such a subterm next time.
+        count = {}; order = []; cached = {}; wrappers = {}; stack = [(expr, False)] # "order" is the post-order of the walked lists
+        while stack:
+            (e, done) = stack.pop()
+            if done: order.append(e); continue
+            while isinstance(e, Concolic):
+                if isinstance(e.expr, list):
+                    if '_formula' in e.__dict__: cached[id(e.expr)] = e._formula
+                    else: wrappers.setdefault(id(e.expr), {})[id(e)] = e
+                e = e.expr
+            if not isinstance(e, (list, tuple)): continue
+            count[id(e)] = count.get(id(e), 0) + 1
+            if count[id(e)] == 1 and id(e) not in cached: stack.append((e, True)); stack.extend((c, False) for c in reversed(e))
+        names = {}; bindings = []; texts = {} # a list id -> (its text, whether the text is free of "let" names)
+        def emit(e):
+            while isinstance(e, Concolic): e = e.expr
+            if isinstance(e, str): return e, True
+            if not isinstance(e, (list, tuple)): raise NotImplementedError
+            if id(e) in names: return names[id(e)], False
+            if id(e) in cached: return cached[id(e)], True
+            parts = [emit(c) for c in e]; texts[id(e)] = ("(" + " ".join(t for (t, _) in parts) + ")", all(f for (_, f) in parts))
+            return texts[id(e)]
+        shared = [k for (k, v) in count.items() if v > 1]
+        for k in [k for k in shared if k in cached]: bindings.append((f"_let_{len(bindings)}", cached[k])); names[k] = bindings[-1][0]
+        for e in order:
+            if count[id(e)] > 1 and id(e) not in names: bindings.append((f"_let_{len(bindings)}", emit(e)[0])); names[id(e)] = bindings[-1][0]
+        formula = emit(expr)[0]
+        for (k, objs) in wrappers.items():
+            if (text := cached.get(k)) is None and k in texts and texts[k][1]: text = texts[k][0]
+            if text is not None:
+                for obj in objs.values(): obj._formula = text
+        for (name, term) in reversed(bindings): formula = f"(let (({name} {term})) {formula})"
+        return formula
+
     @staticmethod
     def _get_formula(expr, mode):
         if isinstance(expr, Concolic): # Please note that this branch must be placed first!
             return Predicate._get_formula(expr.expr, mode) if mode else expr.value
         if isinstance(expr, str):
             return expr
-        if isinstance(expr, list):
+        if isinstance(expr, (list, tuple)):
             return "(" + " ".join(Predicate._get_formula(exp, mode) for exp in expr) + ")"
         raise NotImplementedError
 
     def __str__(self):
-        return f"{Predicate.get_formula_deep(self.expr)} = {self.value}"
+        return f"{self.get_formula_of_expr()} = {self.value}"
@@ -0,0 +1,87 @@
+# Copyright: see copyright.txt
+
+import atexit, logging, os, select, subprocess, time
+
+log = logging.getLogger("ct.session")
+
+class SolverSession:
+    sentinel = 'conbyte-end-of-response' # echoed by the solver after each of our requests
+
+    def __init__(self, cmd, timeout):
+        self.cmd = cmd # must contain the incremental option of the solver
+        self.timeout = timeout # (sec.) how long we wait for a response before regarding the solver as stuck
+        self.process = None; self.busy = False; self.cancelled = False
+        atexit.register(self.close)
+
+    def start(self):
+        self.close()
+        self.process = subprocess.Popen(self.cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        self.buffer = b''; self.declared = {} # variables declared at the outermost level
+        self.levels = [] # keys of the assertions at each push level, "None" if the level cannot be shared
+        self._write("(set-logic ALL)\n")
+
+    def close(self):
+        if self.process is not None:
+            try: self.process.kill(); self.process.wait()
+            except: pass
+            for f in (self.process.stdin, self.process.stdout):
+                try: f.close()
+                except: pass
+        self.process = None
+
+    def query(self, var_to_types, asserts, get_vars, keys=None, timeout=None, core=False):
+        ##########################################################################################
+        # The session is restarted if the previous query was interrupted (e.g., by total_timeout),
+        # if the solver has crashed or exceeded its time limit, or if some variable should be re-
+        # declared with another type (e.g., when the same engine explores another function).
+        if self.busy or self.process is None or self.process.poll() is not None or \
+            any(self.declared.get(name, _type) != _type for (name, _type) in var_to_types.items()):
+            self.start()
+        self.busy = True
+        try:
+            ##########################################################################################
+            # If "keys" (one for each assertion) are given, the assertions are pushed one level each,
+            # and they are kept after this query. The next query then only has to pop to the longest
+            # common prefix of their keys and to push its own remaining assertions. Otherwise all the
+            # assertions are pushed at one level which is popped at the beginning of the next query.
+            if keys is None: keys = [None]; asserts = ["\n".join(asserts)]
+            common = 0 if any(name not in self.declared for name in var_to_types) else \
+                next((i for (i, (k1, k2)) in enumerate(zip(self.levels, keys)) if k1 is None or k1 != k2), min(len(self.levels), len(keys)))
+            message = f"(pop {len(self.levels) - common})\n" if len(self.levels) > common else "" # variables must be declared at the outermost level
+            message += "".join(f"(declare-const {name} {_type})\n" for (name, _type) in var_to_types.items() if name not in self.declared)
+            message += "".join(f"(push 1)\n{assertion}\n" for assertion in asserts[common:])
+            self.declared.update(var_to_types); self.levels = keys
+            outputs = self._request(message + "(check-sat)\n", timeout) # may be shorter than the solver's own limit
+            if outputs and outputs[0] == 'sat':
+                outputs += self._request(get_vars + "\n")
+            elif outputs and outputs[0] == 'unsat' and core: # the names of a subset of the (named) assertions which is still unsat
+                outputs += self._request("(get-unsat-core)\n")
+        except (BrokenPipeError, TimeoutError, InterruptedError) as e:
+            log.smtlib2(f"Solver session is restarted due to: {type(e).__name__}")
+            self.close(); outputs = []
+        self.busy = False
+        return outputs
+
+    def interrupt(self): # called by another thread to give up the current query, which then returns no outputs
+        self.cancelled = True
+        if (process := self.process) is not None:
+            try: process.kill() # the pending read sees the end of the output
+            except: pass
+
+    def _request(self, message, timeout=None):
+        if self.cancelled: raise InterruptedError # The solver may have been started after it was interrupted.
+        self._write(message + f'(echo "{self.sentinel}")\n')
+        outputs = []; deadline = time.time() + (self.timeout if timeout is None else timeout)
+        while True:
+            while b'\n' not in self.buffer:
+                if (remaining := deadline - time.time()) <= 0 or not select.select([self.process.stdout], [], [], remaining)[0]:
+                    raise TimeoutError
+                if not (data := os.read(self.process.stdout.fileno(), 65536)):
+                    raise InterruptedError if self.cancelled else BrokenPipeError # the solver has exited
+                self.buffer += data
+            line, self.buffer = self.buffer.split(b'\n', 1); line = line.decode().strip()
+            if self.sentinel in line: return outputs
+            if line: outputs.append(line)
+
+    def _write(self, message):
+        self.process.stdin.write(message.encode()); self.process.stdin.flush()
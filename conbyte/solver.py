@@ -1,28 +1,41 @@
-import logging, os, re, subprocess, sys, time
+import concurrent.futures, itertools, json, logging, os, queue, re, subprocess, sys, threading, time
+from fractions import Fraction
+from conbyte.archive import FormulaArchive
+from conbyte.cache import QueryCache
 from conbyte.concolic import Concolic
+from conbyte.evaluator import evaluate, evaluate_shallow
 from conbyte.predicate import Predicate
-from conbyte.utils import py2smt
+from conbyte.session import SolverSession
+from conbyte.utils import parse_smt, py2smt, sexpr2py, tokenize_smt
 
 log = logging.getLogger("ct.solver")
 
 class Solver:
     # options = {"lan": "smt.string_solver=z3str3", "stdin": "-in"}
     cnt = 1 # for store
+    initial_timeout = 1 # (sec.) the time limit of a query at its first attempt
 
     @classmethod # similar to our constructor
-    def set_basic_configurations(cls, solver, timeout, safety, store, statsdir):
-        cls.safety = safety; cls.statsdir = statsdir
-        cls.stats = {'sat_number': 0, 'sat_time': 0, 'unsat_number': 0, 'unsat_time': 0, 'otherwise_number': 0, 'otherwise_time': 0}
-        if cls.statsdir: os.system(f"mkdir -p '{cls.statsdir}/formula'")
+    def set_basic_configurations(cls, solver, timeout, safety, store, statsdir, share_prefix=False, jobs=1, query_cache=None, portfolio=None):
+        cls.safety = safety; cls.statsdir = statsdir; cls.share_prefix = share_prefix; cls.timeout = timeout
+        cls.latency = {} # the kind of queries -> their average latency (sec.)
+        cls.query_cache = QueryCache(query_cache) if query_cache else None # shared by different runs
+        cls.stats = {'sat_number': 0, 'sat_time': 0, 'unsat_number': 0, 'unsat_time': 0, 'otherwise_number': 0, 'otherwise_time': 0, 'retry_number': 0, 'retry_time': 0, 'skipped_number': 0, 'native_number': 0, 'native_time': 0, 'native_mismatch_number': 0, 'cache_number': 0, 'cache_time': 0}
         if store is not None:
             if not os.path.isdir(store):
                 if not re.compile(r"^\d+$").match(store):
                     raise IOError(f"Query folder {store} not found")
         cls.store = store
+        cls.telemetry = os.path.join(statsdir, 'queries.jsonl') if statsdir else None # one record for each query, summarized by summarize_queries.py
+        ##########################################################################################
+        # Formulas dumped into a directory are collected in a compressed archive written in background.
+        for archive in getattr(cls, 'archives', []): archive.close()
+        cls.archives = [FormulaArchive(os.path.join(d, 'formula.tar.gz')) for d in (store, statsdir) if d is not None and not re.compile(r"^\d+$").match(d)]
         ##########################################################################################
         # Build the command from the solver type
         if solver == "cvc4":
-            cls.cmd = ["cvc4"] + ["--produce-models", "--lang", "smt", "--quiet", "--strings-exp"]
+            cls.portfolio = portfolio or ["--strings-exp"] # the options of each configuration raced on every query
+            cls.cmd = ["cvc4"] + ["--produce-models", "--lang", "smt", "--quiet"] + cls.portfolio[0].split()
         # elif solver == "z3seq":
         #     cls.cmd = "z3 -in".split(' ')
         # elif solver == "z3str":
@@ -38,90 +51,409 @@ class Solver:
             cls.cmd += ["-T:" + str(timeout)]
         else:
             cls.cmd += ["--tlimit=" + str(1000 * timeout)]
+        ##########################################################################################
+        # The long-lived sessions (one for each configuration of the portfolio in each solving thread) take all queries
+        # of this engine. Since "--tlimit" would limit the lifetime of the whole process, we limit the time of each query
+        # with "--tlimit-per" instead.
+        assert isinstance(jobs, int) and jobs >= 1
+        for session in itertools.chain(*getattr(cls, 'sessions', [])): session.close()
+        base = cls.cmd[:-1 - len(cls.portfolio[0].split())] # without the options of the first configuration
+        cls.sessions = [[SolverSession(base + config.split() + ["--incremental", "--produce-unsat-cores", "--tlimit-per=" + str(1000 * timeout)], timeout + 5) for config in cls.portfolio] for _ in range(jobs)]
+        cls.jobs = jobs; cls.lock = threading.Lock()
+        cls.portfolio_wins = {} # the kind of queries -> the number of queries won by each configuration
+        cls.stats['portfolio_number'] = [0] * len(cls.portfolio); cls.stats['portfolio_time'] = [0] * len(cls.portfolio)
+
+    @classmethod
+    def find_models_from_constraints(cls, engine, constraints):
+        ##########################################################################################
+        # The constraints which cannot be decided without the solver are solved in parallel, each
+        # in a session of its own. Their SMT-ids are assigned in advance, so the logs, the dumped
+        # formulas and the returned models all follow the order of the given constraints.
+        models = [None] * len(constraints); tasks = []
+        for (i, constraint) in enumerate(constraints):
+            log.smtlib2(f"Solving To: {constraint}")
+            sliced, pinned = Solver._slice_constraints(engine, constraint)
+            var_to_types, declare_vars, queries, get_vars = Solver._build_formulas_from_constraints(engine, sliced)
+            if Solver._contains_unsat_assertions(engine, queries):
+                cls.stats['skipped_number'] += 1; log.smtlib2("Skipped since it contains a set of assertions known to be unsat")
+                cls._record(None, sliced, var_to_types, queries, 'unsat', 0, 'unsat_store'); continue
+            if (model := Solver._find_model_from_cache(engine, constraint)) is not None:
+                log.smtlib2(f"Cache hit／Model: {model}")
+                cls._record(None, sliced, var_to_types, queries, 'sat', 0, 'model_cache'); models[i] = model; continue
+            limit = cls._time_limit(engine, var_to_types, queries, engine.constraint_retries.get(constraint.id, 0))
+            tasks.append((i, Solver.cnt, sliced, pinned, var_to_types, declare_vars, queries, get_vars, limit)); Solver.cnt += 1
+        if len(tasks) <= 1: # no need to start any thread
+            results = [cls._solve(engine, cls.sessions[0], *task[1:]) for task in tasks]
+        else:
+            with concurrent.futures.ThreadPoolExecutor(len(tasks)) as executor:
+                results = list(executor.map(lambda sessions, task: cls._solve(engine, sessions, *task[1:]), cls.sessions, tasks))
+        for (task, (model, retry)) in zip(tasks, results):
+            models[task[0]] = model; constraint = constraints[task[0]]
+            if retry: # to be retried later with more time
+                engine.constraint_retries[constraint.id] = engine.constraint_retries.get(constraint.id, 0) + 1
+                engine.constraints_to_solve.append(constraint); log.smtlib2(f"Requeued since the time limit ({task[-1]:.2f}s) is exceeded: {constraint}")
+        return models
+
+    @classmethod
+    def _time_limit(cls, engine, var_to_types, queries, retries):
+        ##########################################################################################
+        # Each query starts with a short time limit, which is quadrupled every time it is retried, and
+        # is at least a few times the latency observed of similar queries. However, it never exceeds
+        # the timeout given by the user, nor a fixed share of the remaining total budget.
+        limit = min(cls.initial_timeout, cls.timeout) * 4 ** retries
+        if (latency := cls.latency.get(Solver._kind(var_to_types, queries))) is not None: limit = max(limit, 4 * latency)
+        if hasattr(engine, 'start_time'): limit = min(limit, (engine.total_timeout - (time.time() - engine.start_time)) / 4)
+        return max(min(limit, cls.timeout), 0.1)
+
+    @staticmethod
+    def _kind(var_to_types, queries): # queries over the same types of variables with a similar number of assertions are regarded as similar
+        return tuple(sorted(set(var_to_types.values()))), len(queries).bit_length()
 
     @classmethod
-    def find_model_from_constraint(cls, engine, constraint):
-        formulas = Solver._build_formulas_from_constraint(engine, constraint); log.smtlib2(f"Solving To: {constraint}")
+    def _solve(cls, engine, sessions, cnt, constraints, pinned, var_to_types, declare_vars, queries, get_vars, limit):
+        formulas = f"(set-logic ALL)\n{declare_vars}\n" + "\n".join(queries) + f"\n(check-sat)\n{get_vars}\n" # a standalone version for the following dumps
+        keys = [c.id for c in constraints] if cls.share_prefix else None # the path from the root identifies each prefix
         start = time.time()
-        try: completed_process = subprocess.run(cls.cmd, input=formulas.encode(), capture_output=True)
-        except subprocess.CalledProcessError as e: print(e.output)
+        if cls.query_cache is not None:
+            canonical, mapping = Solver._canonicalize(var_to_types, queries); key = cls.query_cache.key(cls.cmd, canonical)
+        if (outputs := Solver._solve_natively(engine, constraints, var_to_types)) is not None:
+            with cls.lock: cls.stats['native_number'] += 1; cls.stats['native_time'] += time.time() - start
+            log.smtlib2(f"SMT-id: {cnt} is decided natively"); source = 'native'
+            if cls.safety >= 1: outputs = cls._check_natively_decided(sessions, cnt, var_to_types, queries, get_vars, keys, outputs, formulas)
+        elif cls.query_cache is not None and (outputs := Solver._rename_model(cls.query_cache.get(key), mapping)) is not None:
+            with cls.lock: cls.stats['cache_number'] += 1; cls.stats['cache_time'] += time.time() - start
+            log.smtlib2(f"SMT-id: {cnt} is found in the query cache"); source = 'query_cache'
+        else:
+            kind = Solver._kind(var_to_types, queries); source = 'solver'
+            outputs, winner = cls._race(sessions, kind, var_to_types, queries, get_vars, keys, limit if limit < cls.timeout else None)
+            if outputs and outputs[0] in ('sat', 'unsat'):
+                with cls.lock:
+                    cls.latency[kind] = (time.time() - start + cls.latency.get(kind, time.time() - start)) / 2
+                    cls.portfolio_wins.setdefault(kind, [0] * len(cls.portfolio))[winner] += 1
+                    cls.stats['portfolio_number'][winner] += 1; cls.stats['portfolio_time'][winner] += time.time() - start
+                if len(cls.portfolio) > 1: log.smtlib2(f"SMT-id: {cnt} is answered by the configuration: {cls.portfolio[winner]}")
+            if cls.query_cache is not None and outputs and outputs[0] in ('sat', 'unsat', 'unknown'): # errors are not cached
+                if (t := Solver._rename_model(outputs if outputs[0] == 'sat' else outputs[:1], {v: k for (k, v) in mapping.items()})) is not None: cls.query_cache.put(key, t) # unsat cores refer to our order of assertions
         elapsed = time.time() - start
-        output = completed_process.stdout.decode()
         model = None
-        if output is None or len(output) == 0:
-            status = "UNKNOWN"
-        else:
-            outputs = output.splitlines(); status = outputs[0].lower()
-            if "error" in status:
-                print('solver error:', status)
-                print(f"at SMT-id: {Solver.cnt}")
-                print(formulas)
-                # sys.exit(1)
-            if "sat" == status:
-                cls.stats['sat_number'] += 1; cls.stats['sat_time'] += elapsed
-                model = Solver._get_model(engine, outputs[1:])
-            else:
-                if "unsat" == status: cls.stats['unsat_number'] += 1; cls.stats['unsat_time'] += elapsed
-                else: status = "UNKNOWN"; cls.stats['otherwise_number'] += 1; cls.stats['otherwise_time'] += elapsed
-        ##########################################################################################
-        if cls.store is not None:
-            if re.compile(r"^\d+$").match(cls.store):
-                if int(cls.store) == Solver.cnt:
-                    with open(cls.store + f"_{status}.smt2", 'w') as f:
-                        f.write(formulas)
+        with cls.lock: # the statistics and the unsat assertions are shared by all solving threads
+            if len(outputs) == 0 and limit < cls.timeout: # Only the final attempt of a constraint is counted as its outcome.
+                status = "RETRY"; cls.stats['retry_number'] += 1; cls.stats['retry_time'] += elapsed
+            elif len(outputs) == 0:
+                status = "UNKNOWN"; cls.stats['otherwise_number'] += 1; cls.stats['otherwise_time'] += elapsed
             else:
-                with open(os.path.join(cls.store, f"{Solver.cnt}_{status}.smt2"), 'w') as f:
+                status = outputs[0].lower()
+                if "error" in status:
+                    print('solver error:', status)
+                    print(f"at SMT-id: {cnt}")
+                    print(formulas)
+                    # sys.exit(1)
+                if "sat" == status:
+                    cls.stats['sat_number'] += 1; cls.stats['sat_time'] += elapsed
+                    model = Solver._get_model(engine, outputs[1:]); model.update(pinned)
+                else:
+                    if "unsat" == status: cls.stats['unsat_number'] += 1; cls.stats['unsat_time'] += elapsed; Solver._add_unsat_assertions(engine, Solver._unsat_core(outputs[1:], queries))
+                    else: status = "UNKNOWN"; cls.stats['otherwise_number'] += 1; cls.stats['otherwise_time'] += elapsed
+        ##########################################################################################
+        if cls.store is not None and re.compile(r"^\d+$").match(cls.store):
+            if int(cls.store) == cnt:
+                with open(cls.store + f"_{status}.smt2", 'w') as f:
                     f.write(formulas)
-        if cls.statsdir:
-            with open(cls.statsdir + f"/formula/{Solver.cnt}_{status}.smt2", 'w') as f:
-                f.write(formulas)
+        for archive in cls.archives: archive.add(f"{cnt}_{status}.smt2", formulas)
+        cls._record(cnt, constraints, var_to_types, queries, status, elapsed, source, limit=limit, **({'config': cls.portfolio[winner]} if source == 'solver' else {}))
         ##########################################################################################
-        log.smtlib2(f"SMT-id: {Solver.cnt}／Status: {status}／Model: {model}")
-        Solver.cnt += 1
-        return model
+        log.smtlib2(f"SMT-id: {cnt}／Status: {status}／Model: {model}")
+        return model, status == "RETRY"
+
+    @classmethod
+    def _race(cls, sessions, kind, var_to_types, queries, get_vars, keys, timeout):
+        ##########################################################################################
+        # Each configuration of the portfolio works on the query in a session of its own. The one
+        # which has won the most queries of this kind starts first, and the others join only if it
+        # does not answer within a short head start (twice the latency observed of this kind). The
+        # first definitive answer (sat or unsat) is taken, and the sessions still working on it are
+        # interrupted. Returns the outputs and the index of the configuration which produced them.
+        queries = [f"(assert (! {q[len('(assert '):-1]} :named _a{i}))" for (i, q) in enumerate(queries)] # so that the solver can tell us an unsat core
+        if len(sessions) == 1: return sessions[0].query(var_to_types, queries, get_vars, keys, timeout, True), 0
+        wins = cls.portfolio_wins.get(kind, [0] * len(sessions))
+        order = sorted(range(len(sessions)), key=lambda i: -wins[i]) # stable, so the first configuration wins ties
+        head_start = min(2 * cls.latency.get(kind, 0), (cls.timeout if timeout is None else timeout) / 4) if wins[order[0]] > 0 else 0
+        results = queue.Queue(); threads = {}
+        def start(i):
+            sessions[i].cancelled = False
+            threads[i] = threading.Thread(target=lambda: results.put((i, sessions[i].query(var_to_types, queries, get_vars, keys, timeout, True))), daemon=True)
+            threads[i].start()
+        start(order[0]); deadline = time.time() + head_start
+        answers = {}; winner = None
+        while len(answers) < len(sessions):
+            try: (i, outputs) = results.get(timeout=max(deadline - time.time(), 0) if len(threads) < len(sessions) else None)
+            except queue.Empty: outputs = None
+            if outputs is not None:
+                answers[i] = outputs
+                if outputs and outputs[0] in ('sat', 'unsat'): winner = i; break
+            for j in order: # the head start is over, or the preferred configuration has failed
+                if j not in threads: start(j)
+        for j in threads:
+            if j not in answers: sessions[j].interrupt()
+        for thread in threads.values(): thread.join() # so that the sessions are free for the next query
+        if winner is not None: return answers[winner], winner
+        if any(len(outputs) == 0 for outputs in answers.values()): return [], order[0] # interrupted by the time limit
+        return next(iter(answers.values())), order[0]
+
+    @classmethod
+    def _record(cls, cnt, constraints, var_to_types, queries, status, elapsed, source, **extra):
+        ##########################################################################################
+        # Each query (including those answered without the solver, whose SMT-ids are None if they
+        # are not even numbered) is appended as a JSON line to the telemetry file in statsdir. The
+        # depth is the length of the whole constraint path, while the assertions and the bytes only
+        # count the sliced part which is actually sent to the solver.
+        if cls.telemetry is None: return
+        record = {'smt_id': cnt, 'depth': constraints[-1].height, 'assertions': len(queries), 'bytes': sum(len(q.encode()) + 1 for q in queries),
+                  'variables': len(var_to_types), 'theories': Solver._theories(var_to_types, queries), 'status': status, 'time': elapsed, 'source': source, **extra}
+        with cls.lock:
+            with open(cls.telemetry, 'a') as f: f.write(json.dumps(record) + '\n')
+
+    @staticmethod
+    def _theories(var_to_types, queries): # the (rough) theories used by the assertions
+        tokens = set(itertools.chain.from_iterable(tokenize_smt(q) for q in queries)); types = set(var_to_types.values())
+        theories = {'core'}
+        if 'Int' in types or tokens & {'str.len', 'str.indexof', 'str.to.int', 'str.to_int', 'str.to_code', 'div', 'mod'}: theories.add('ints')
+        if 'Real' in types or tokens & {'/', 'to_real'}: theories.add('reals')
+        if 'String' in types or any(t.startswith('str.') for t in tokens): theories.add('strings')
+        if any(t.startswith('re.') for t in tokens): theories.add('regexes')
+        return sorted(theories)
+
+    @staticmethod
+    def _canonicalize(var_to_types, queries):
+        ##########################################################################################
+        # Formulas of the same shape should share one cache entry even if they come from different
+        # functions or modules. Therefore the assertions are deduplicated and sorted by their shapes
+        # (i.e., with all variables looking the same), and then the variables are renamed in order
+        # of their first occurrences. Numerals are also normalized. The returned mapping (from the
+        # canonical names to ours) is used to translate the models back.
+        def numeral(t): # remove leading zeros, and trailing zeros after the point (but keep one digit there)
+            if re.fullmatch(r"\d+", t): return str(int(t))
+            if re.fullmatch(r"\d+\.\d*", t): (a, b) = t.split('.'); return str(int(a)) + '.' + (b.rstrip('0') or '0')
+            return t
+        def normalize(tokens):
+            tokens = [numeral(t) for t in tokens]
+            i = 0
+            while i + 3 < len(tokens):
+                if tokens[i:i+2] == ['(', '-'] and tokens[i+3] == ')' and re.fullmatch(r"0(\.0)?", tokens[i+2]): tokens[i:i+4] = [tokens[i+2]] # (- 0) -> 0
+                i += 1
+            return tuple(tokens)
+        shape = lambda tokens: tuple('_v' if t in var_to_types else t for t in tokens)
+        asserts = sorted({normalize(tokenize_smt(q)) for q in queries}, key=lambda tokens: (shape(tokens), tokens))
+        mapping = {} # our names -> canonical names
+        for t in (t for tokens in asserts for t in tokens):
+            if t in var_to_types and t not in mapping: mapping[t] = f'_v{len(mapping)}'
+        canonical = "".join(f"(declare-const {v} {var_to_types[k]})\n" for (k, v) in mapping.items()) + "\n".join(" ".join(mapping.get(t, t) for t in tokens) for tokens in asserts)
+        return canonical, {v: k for (k, v) in mapping.items()}
+
+    @staticmethod
+    def _rename_model(outputs, mapping): # rename variables in the responses of the solver, or return None if impossible
+        if outputs is None: return None
+        unparse = lambda e: "(" + " ".join(map(unparse, e)) + ")" if isinstance(e, list) else e
+        try: return outputs[:1] + ["(" + " ".join(f"({mapping[name]} {unparse(value)})" for pairs in parse_smt("\n".join(outputs[1:])) for (name, value) in pairs) + ")"]
+        except (KeyError, ValueError, TypeError): return None
+
+    ##########################################################################################
+    # The following is a small decision procedure for constraints over integers and booleans
+    # with only linear terms. The bounds of each variable are first propagated from comparisons
+    # between it and constants, and then a bounded number of candidate assignments (the bounds,
+    # neighbors of constants, and the input which generated this constraint) are evaluated in
+    # Python. Only an empty interval proves unsat. Any other case is left to the real solver.
+    native_ops = {'and', 'or', 'not', 'xor', '=>', 'ite', '=', 'distinct', '<', '<=', '>', '>=', '+', '-', '*', 'div', 'mod', 'abs'}
+    native_budget = 1000 # max number of candidate assignments to be evaluated for one constraint
+
+    @classmethod
+    def _solve_natively(cls, engine, constraints, var_to_types):
+        if any(_type not in ('Int', 'Bool') for _type in var_to_types.values()): return None
+        predicates = [c.last_predicate for c in constraints][::-1] # The last predicate is the most likely to be violated.
+        constants = set(); memo = {}
+        if any(Solver._is_native(p.expr, constants, memo) is None for p in predicates): return None
+        bounds = {name: [None, None, set()] for (name, _type) in var_to_types.items() if _type == 'Int'} # lower, upper, excluded
+        for p in predicates: Solver._propagate_bounds(p.expr, p.value, bounds)
+        if any(lo is not None and hi is not None and lo > hi for (lo, hi, _) in bounds.values()): return ['unsat']
+        ##########################################################################################
+        hints = [args for args in (engine.constraint_inputs.get(constraints[-1].id), engine.model_cache[-1] if engine.model_cache else None) if args]
+        candidates = {}
+        for (name, _type) in var_to_types.items():
+            values = [args[name[:-len('_python')]] for args in hints if type(args.get(name[:-len('_python')])) is (bool if _type == 'Bool' else int)]
+            if _type == 'Bool': values += [False, True]
+            else:
+                (lo, hi, excluded) = bounds[name]
+                values += [v for v in (lo, hi) if v is not None] + [0, 1, -1] + [c + d for c in constants for d in (0, -1, 1)]
+                if lo is not None and hi is not None and hi - lo <= 64: values += range(lo, hi + 1)
+                values = [v for v in values if (lo is None or lo <= v) and (hi is None or v <= hi) and v not in excluded]
+            candidates[name] = list(dict.fromkeys(values)) # remove duplicates while keeping the order
+            if not candidates[name]: return None
+        for assignment in itertools.islice((dict(zip(candidates, values)) for values in itertools.product(*candidates.values())), cls.native_budget):
+            memo = {}
+            try:
+                if all(evaluate(p.expr, assignment, memo) == p.value for p in predicates):
+                    return ['sat', "(" + " ".join(f"({name} {py2smt(value)})" for (name, value) in assignment.items()) + ")"] # in the same format as the solver's
+            except NotImplementedError: pass # e.g., divided by zero
+            except Exception: return None
+        return None
+
+    @classmethod
+    def _check_natively_decided(cls, sessions, cnt, var_to_types, queries, get_vars, keys, outputs, formulas):
+        ##########################################################################################
+        # Under --safety, the verdict of the native procedure is also checked against the solver,
+        # since a wrong unsat would make us skip feasible branches. If they disagree, the answer
+        # of the solver is taken instead (or the program exits in level 2).
+        expected, _ = cls._race(sessions, Solver._kind(var_to_types, queries), var_to_types, queries, get_vars, keys, None)
+        if not expected or expected[0] not in ('sat', 'unsat') or expected[0] == outputs[0]: return outputs
+        with cls.lock: cls.stats['native_mismatch_number'] += 1
+        print(f"The native procedure decides {outputs[0]} but the solver decides {expected[0]} at SMT-id: {cnt}"); print(formulas)
+        if cls.safety >= 2: sys.exit(1)
+        return expected
+
+    @staticmethod
+    def _is_native(expr, constants, memo): # returns whether the expression contains variables, or None if it is not supported
+        if isinstance(expr, Concolic): expr = expr.expr
+        if id(expr) in memo: return memo[id(expr)]
+        if isinstance(expr, str):
+            if expr.endswith('_python') and not expr.startswith('"'): return True
+            try: value = evaluate(expr, {})
+            except NotImplementedError: return None
+            if type(value) is int: constants.add(value)
+            return False if type(value) in (bool, int) else None
+        if not isinstance(expr, (list, tuple)) or len(expr) < 2 or expr[0] not in Solver.native_ops: return None
+        args = [Solver._is_native(e, constants, memo) for e in expr[1:]]
+        if None in args: result = None
+        elif expr[0] == '*' and args.count(True) > 1: result = None # nonlinear
+        elif expr[0] in ('div', 'mod') and args[1]: result = None # nonlinear
+        else: result = any(args)
+        memo[id(expr)] = result
+        return result
+
+    @staticmethod
+    def _propagate_bounds(expr, value, bounds):
+        while isinstance(expr, Concolic): expr = expr.expr
+        if not isinstance(expr, (list, tuple)): return
+        if expr[0] == 'not': Solver._propagate_bounds(expr[1], not value, bounds)
+        elif (expr[0] == 'and' and value) or (expr[0] == 'or' and not value):
+            for e in expr[1:]: Solver._propagate_bounds(e, value, bounds)
+        elif expr[0] in ('=', 'distinct', '<', '<=', '>', '>=') and len(expr) == 3:
+            (op, lhs, rhs) = expr
+            while isinstance(lhs, Concolic): lhs = lhs.expr
+            while isinstance(rhs, Concolic): rhs = rhs.expr
+            if isinstance(rhs, str) and rhs in bounds: (lhs, rhs) = (rhs, lhs); op = {'<': '>', '<=': '>=', '>': '<', '>=': '<='}.get(op, op)
+            if not (isinstance(lhs, str) and lhs in bounds): return
+            try: c = evaluate(rhs, {})
+            except NotImplementedError: return # not a constant
+            if type(c) is not int: return
+            if not value: op = {'=': 'distinct', 'distinct': '=', '<': '>=', '<=': '>', '>': '<=', '>=': '<'}[op]
+            b = bounds[lhs]
+            if op in ('<', '<=', '='): b[1] = min(t for t in (b[1], c - (op == '<')) if t is not None)
+            if op in ('>', '>=', '='): b[0] = max(t for t in (b[0], c + (op == '>')) if t is not None)
+            if op == 'distinct': b[2].add(c)
+
+    @staticmethod
+    def _add_unsat_assertions(engine, queries):
+        # Every set of assertions is indexed by one of its members, so that a later lookup only
+        # has to examine the sets which are indexed by the assertions of the constraint in question.
+        engine.unsat_assertions.setdefault(queries[-1], []).append(frozenset(queries))
+
+    @staticmethod
+    def _unsat_core(outputs, queries):
+        ##########################################################################################
+        # An unsat core (e.g., two contradictory length guards) usually also appears in many other
+        # constraint paths, all of which can then be skipped. If the solver gives no valid core
+        # (e.g., the answer comes from the native procedure or the query cache, or the solver does
+        # not support it), the whole set of assertions is regarded as the core instead.
+        try:
+            (names,) = parse_smt("\n".join(outputs))
+            core = [queries[int(name[len('_a'):])] for name in names if re.fullmatch(r"_a\d+", name)]
+            if core and len(core) == len(names): log.smtlib2(f"Unsat core: {len(core)} of {len(queries)} assertions"); return core
+        except (ValueError, TypeError, IndexError): pass
+        return queries
+
+    @staticmethod
+    def _contains_unsat_assertions(engine, queries):
+        queries_set = set(queries)
+        return any(unsat_set <= queries_set for q in queries_set for unsat_set in engine.unsat_assertions.get(q, []))
+
+    @staticmethod
+    def _find_model_from_cache(engine, constraint):
+        ##########################################################################################
+        # Before calling the solver, we check whether some assignment we already have (i.e., an
+        # input executed before or a model returned before) satisfies this constraint. The last
+        # predicate is evaluated first since it is the one most likely to be violated.
+        asserts = constraint.get_all_asserts()[::-1]
+        for args in reversed(engine.model_cache):
+            assignment = {k + '_python': v for (k, v) in args.items()} # '_python' is used to avoid name collision
+            memo = {} # shared by all predicates under the same assignment
+            try:
+                if all(evaluate(p.expr, assignment, memo) == p.value for p in asserts): return args.copy()
+            except NotImplementedError: return None # this constraint cannot be evaluated in Python
+            except Exception: pass # e.g., some argument has a different type from our expectation
+        return None
 
     @staticmethod
     def _get_model(engine, models):
         model = {}
-        for line in models:
-            assert line.startswith('((') and line.endswith('))')
-            name, value = line[2:-2].split(" ", 1)
-            if engine.var_to_types[name] == "Bool":
-                if value == 'true': value = True
-                elif value == 'false': value = False
-                else: raise NotImplementedError
-            elif engine.var_to_types[name] == "Real":
-                if "(" in value:
-                    value = -float(value.replace("(", "").replace(")", "").split(" ")[1])
+        for pairs in parse_smt("\n".join(models)): # The responses may be either one or several lines.
+            for (name, value) in pairs:
+                value = sexpr2py(value)
+                if engine.var_to_types[name] == "Bool":
+                    if type(value) is not bool: raise NotImplementedError
+                elif engine.var_to_types[name] == "Real": value = float(value)
+                elif engine.var_to_types[name] == "Int": value = int(value)
+                elif engine.var_to_types[name] == "String":
+                    if type(value) is not str: raise NotImplementedError
                 else:
-                    value = float(value)
-            elif engine.var_to_types[name] == "Int":
-                if "(" in value:
-                    value = -int(value.replace("(", "").replace(")", "").split(" ")[1])
-                else:
-                    value = int(value)
-            elif engine.var_to_types[name] == "String":
-                assert value.startswith('"') and value.endswith('"')
-                value = value[1:-1]
-                value = value.replace('""', '"').replace("\\t", "\t").replace("\\n", "\n").replace("\\r", "\r").replace("\\\\", "\\")
-                # Note the order above must be in reverse with its encoding method (line 41 in conbyte/utils.py)
-            else:
-                raise NotImplementedError
-            assert name.endswith('_python') # '_python' is used to avoid name collision
-            model[name[:-len('_python')]] = value
+                    raise NotImplementedError
+                assert name.endswith('_python') # '_python' is used to avoid name collision
+                model[name[:-len('_python')]] = value
         return model
 
     @staticmethod
-    def _build_formulas_from_constraint(engine, constraint):
-        declare_vars = "\n".join(f"(declare-const {name} {_type})" for (name, _type) in engine.var_to_types.items())
-        queries = "\n".join(assertion.get_formula() for assertion in constraint.get_all_asserts())
-        get_vars = "\n".join(f"(get-value ({name}))" for name in engine.var_to_types.keys())
-        return f"(set-logic ALL)\n{declare_vars}\n{queries}\n(check-sat)\n{get_vars}\n"
+    def _slice_constraints(engine, constraint):
+        ##########################################################################################
+        # We only keep the constraints (in the path) which transitively share variables with the
+        # last one. Since the other constraints do not mention these variables, they are still
+        # satisfied if the rest variables are pinned to the values of the input which generated
+        # this constraint (the input took the path before this constraint), so these values are
+        # also returned in order to override those found by the solver.
+        constraints = constraint.get_all_constraints()
+        if (args := engine.constraint_inputs.get(constraint.id)) is None: return constraints, {}
+        variables = set(constraint.last_predicate.get_variables()); kept = {constraint.id}; changed = True
+        while changed:
+            changed = False
+            for c in constraints:
+                if c.id not in kept and not variables.isdisjoint(c.last_predicate.get_variables()):
+                    variables |= c.last_predicate.get_variables(); kept.add(c.id); changed = True
+        log.smtlib2(f"Slicing: {len(kept)} of {len(constraints)} assertions are kept")
+        return [c for c in constraints if c.id in kept], {k: v for (k, v) in args.items() if k + '_python' not in variables}
+
+    @staticmethod
+    def _build_formulas_from_constraints(engine, constraints):
+        # Only the variables referenced by these constraints are declared and queried. The other
+        # arguments are absent from the model, so they are carried over from the current input.
+        variables = set().union(*(c.last_predicate.get_variables() for c in constraints))
+        var_to_types = {name: _type for (name, _type) in engine.var_to_types.items() if name in variables}
+        declare_vars = "\n".join(f"(declare-const {name} {_type})" for (name, _type) in var_to_types.items())
+        queries = [c.last_predicate.get_formula() for c in constraints]
+        get_vars = f"(get-value ({' '.join(var_to_types.keys())}))" if var_to_types else "" # all values are retrieved at once
+        return var_to_types, declare_vars, queries, get_vars
 
     @classmethod
     def _expr_has_engines_and_equals_value(cls, expr, value):
         if e:=Concolic.find_engine_in_expr(expr):
             if cls.safety <= 0: return e # This line is used to disable the value validation feature temporarily.
+            try: # The expression is evaluated in Python first, and the solver is called only if this fails (e.g., some operator is not supported).
+                result = evaluate_shallow(expr)
+                equal = abs(result - Fraction(value)) <= Fraction(1, 1000000000000000) if isinstance(value, float) else result == value
+            except Exception: equal = None
+            if equal: return e
+            if equal is not None:
+                print(f"(= {Predicate.get_formula_shallow(expr)} {py2smt(value)}) is evaluated to false.")
+                import traceback; traceback.print_stack()
+                if cls.safety >= 2: sys.exit(1)
+                return None
             if isinstance(value, float): # TODO: Floating point operations may cause subtle errors.
                 formulas = f"(assert (and (<= (- (/ 1 1000000000000000)) (- {Predicate.get_formula_shallow(expr)} {py2smt(value)})) (<= (- {Predicate.get_formula_shallow(expr)} {py2smt(value)}) (/ 1 1000000000000000))))\n(check-sat)"
             else:
@@ -0,0 +1,29 @@
+# Copyright: see copyright.txt
+
+import sys, threading
+
+class LineTracer:
+    ##########################################################################################
+    # A minimal line coverage collector for a single file, so that the lines executed by the
+    # concolic run can be measured without running the target again under "coverage". Only the
+    # frames whose code belongs to the file are traced line by line, hence the frames of our
+    # concolic objects (and of everything else) cost only a call of the global trace function.
+    # The trace function is also installed for new threads, since func_timeout executes the
+    # target in a thread of its own.
+    ##########################################################################################
+    def __init__(self, filename):
+        self.filename = filename
+        self.lines = set() # the executed line numbers
+
+    def start(self):
+        threading.settrace(self._trace_call); sys.settrace(self._trace_call)
+
+    def stop(self):
+        sys.settrace(None); threading.settrace(None)
+
+    def _trace_call(self, frame, event, arg):
+        return self._trace_line if frame.f_code.co_filename == self.filename else None
+
+    def _trace_line(self, frame, event, arg):
+        if event == 'line': self.lines.add(frame.f_lineno)
+        return self._trace_line
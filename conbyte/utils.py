@@ -1,4 +1,5 @@
-import functools, importlib, inspect, os
+import functools, importlib, inspect, os, re
+from fractions import Fraction
 
 def _int(obj):
     from conbyte.concolic import Concolic
@@ -59,6 +60,45 @@ def py2smt(x): # convert the Python object into the smtlib2 string constant
         return x
     raise NotImplementedError
 
+def smt2py(x): # convert the smtlib2 constant into the Python object, i.e., the inverse of py2smt(...)
+    if x in ('true', 'false'): return x == 'true'
+    if x.startswith('"') and x.endswith('"') and len(x) >= 2:
+        x = x[1:-1]; x_new = ""; i = 0
+        while i < len(x):
+            if x.startswith('""', i): x_new += '"'; i += 2
+            elif x[i] != '\\' or i + 1 == len(x): x_new += x[i]; i += 1
+            elif x[i+1] in '\\nrt': x_new += {'\\': '\\', 'n': '\n', 'r': '\r', 't': '\t'}[x[i+1]]; i += 2
+            elif (m := re.compile(r"x([0-9a-fA-F]{2})|u\{([0-9a-fA-F]{1,6})\}|u([0-9a-fA-F]{4})").match(x, i + 1)):
+                x_new += chr(int(next(g for g in m.groups() if g is not None), 16)); i = m.end()
+            else: x_new += x[i]; i += 1
+        return x_new
+    if x.startswith('(- ') and x.endswith(')'): return -smt2py(x[3:-1])
+    return float(x) if '.' in x else int(x)
+
+smt_token = re.compile(r'"(?:[^"]|"")*"|\|[^|]*\||[()]|[^\s()"|]+')
+
+def tokenize_smt(x): # split the smtlib2 text into parentheses, string constants (possibly with "" inside) and other symbols
+    return smt_token.findall(x)
+
+def parse_smt(x): # parse the smtlib2 text into a list of s-expressions (nested lists of tokens) in one pass over its tokens
+    stack = [[]]
+    for m in smt_token.finditer(x):
+        token = m.group()
+        if token == '(': stack.append([])
+        elif token == ')':
+            if len(stack) == 1: raise ValueError("unbalanced parentheses")
+            e = stack.pop(); stack[-1].append(e)
+        else: stack[-1].append(token)
+    if len(stack) > 1: raise ValueError("unbalanced parentheses")
+    return stack[0]
+
+def sexpr2py(e): # convert the s-expression of a constant (e.g., a value of the model) into the Python object
+    if isinstance(e, list):
+        if len(e) == 2 and e[0] == '-': return -sexpr2py(e[1])
+        if len(e) == 3 and e[0] == '/': return Fraction(sexpr2py(e[1])) / Fraction(sexpr2py(e[2]))
+        raise NotImplementedError
+    return smt2py(e)
+
 def get_module_from_rootdir_and_modpath(rootdir, modpath):
     filepath = os.path.join(rootdir, modpath.replace('.', '/') + '.py')
     spec = importlib.util.spec_from_file_location(modpath, os.path.abspath(filepath))
@@ -0,0 +1,81 @@
+# Copyright: see copyright.txt
+
+import gc, multiprocessing, multiprocessing.connection, multiprocessing.reduction, os, signal, sys, traceback
+
+class Zygote:
+    ##########################################################################################
+    # A zygote is a process which does the expensive preparation (e.g., importing the target
+    # module and all of its dependencies) only once, and then forks a cheap child for each
+    # request, so that all children share what has been prepared (copy-on-write). The garbage
+    # collector is frozen after the preparation, otherwise its collections would touch all the
+    # prepared objects and therefore copy them into every child. Only the zygote signals and
+    # reaps its children, since their pids are not ours and may be reused once reaped.
+    ##########################################################################################
+    def __init__(self, prepare, serve, update=None):
+        self.prepare = prepare # called once in the zygote, whose return value is passed to every call of "serve"
+        self.serve = serve # called in each child with the prepared value, the request and the connections
+        self.update = update # (optional) called in the zygote itself with the prepared value and each request before forking
+        self.process = None; self.child = None
+
+    def is_alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def start(self): # The zygote is forked from the current process, so it starts with the current state of the caller.
+        self.conn, conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=self._loop, args=(conn,), daemon=True); self.process.start()
+
+    def fork(self, request, conns): # the connections are passed to the child as they are, and a handle of the child is returned
+        if self.child is not None: self.child.kill() # so that the zygote is back in its loop
+        if not self.is_alive(): self.start()
+        self.conn.send((request, len(conns)))
+        for c in conns: multiprocessing.reduction.send_handle(self.conn, c.fileno(), self.process.pid)
+        self.child = ZygoteChild(self.conn, self.conn.recv()); return self.child
+
+    def close(self):
+        if self.child is not None: self.child.kill(); self.child = None
+        if self.process is not None:
+            self.conn.close(); self.process.kill(); self.process.join(); self.process = None
+
+    def _loop(self, conn):
+        try: prepared = self.prepare()
+        except Exception: prepared = None # Each child then prepares itself, and fails as it would without the zygote.
+        gc.freeze()
+        while True:
+            try:
+                if (message := conn.recv()) == 'kill': continue # sent when the child had already exited
+                (request, n) = message
+                fds = [multiprocessing.reduction.recv_handle(conn) for _ in range(n)]
+            except EOFError: return # the engine has closed this zygote
+            if self.update is not None: self.update(prepared, request)
+            (r, w) = os.pipe() # The write end is closed only when the child exits, which wakes us up.
+            if (pid := os.fork()) == 0: # child process
+                os.close(r)
+                try: self.serve(prepared, request, [multiprocessing.connection.Connection(fd) for fd in fds])
+                except BaseException: traceback.print_exc()
+                finally:
+                    sys.stdout.flush(); sys.stderr.flush()
+                    os._exit(os.EX_OK) # never returns to the loop, nor runs the exit handlers of the engine
+            os.close(w)
+            for fd in fds: os.close(fd)
+            conn.send(pid)
+            try:
+                while r not in multiprocessing.connection.wait([conn, r]):
+                    if conn.recv() == 'kill': os.kill(pid, signal.SIGKILL) # The pid cannot be reused before we reap the child.
+            except EOFError: os.kill(pid, signal.SIGKILL); return # the engine has closed this zygote
+            finally: os.close(r); os.waitpid(pid, 0)
+            conn.send('exited')
+
+class ZygoteChild: # the counterpart of multiprocessing.Process for a child forked by a zygote, which is killed and reaped by the zygote
+    def __init__(self, conn, pid):
+        self.conn = conn; self.pid = pid; self.exited = False
+
+    def is_alive(self):
+        try:
+            if not self.exited and self.conn.poll(): self.conn.recv(); self.exited = True # the zygote has reaped the child
+        except (OSError, EOFError): self.exited = True # the zygote is gone
+        return not self.exited
+
+    def kill(self): # returns after the child has been reaped
+        try:
+            if self.is_alive(): self.conn.send('kill'); self.conn.recv(); self.exited = True
+        except (OSError, EOFError): self.exited = True
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+
+import argparse, os, sys, tarfile, zlib
+
+# This script extracts formulas from the archive "formula.tar.gz" dumped by "-d DIR" or "--dump_projstats".
+f = argparse.RawTextHelpFormatter._split_lines
+argparse.RawTextHelpFormatter._split_lines = lambda *args, **kwargs: f(*args, **kwargs) + ['']
+parser = argparse.ArgumentParser(formatter_class=argparse.RawTextHelpFormatter)
+parser.add_argument("archive", help="path to the archive, or to the directory containing \"formula.tar.gz\"")
+parser.add_argument("smt_id", nargs='*', help="the number \"SMT-id\" shown in the log\nIf no SMT-id is given, all formulas in the archive are listed instead.")
+parser.add_argument("-o", "--output", dest="output", help="directory to store the extracted files named {SMT-id}_{status}.smt2\n(*) When this option is not set, the formulas are printed to the screen, so one of them can be directly piped into a solver.", default=None)
+args = parser.parse_args()
+
+path = os.path.join(args.archive, 'formula.tar.gz') if os.path.isdir(args.archive) else args.archive
+with tarfile.open(path, 'r:gz') as tar:
+    members = {}
+    try:
+        for m in tar: members[m.name.split('_')[0]] = m
+    except (EOFError, OSError, zlib.error, tarfile.ReadError): # The run was killed while writing its last formula.
+        print(f"{path} is truncated after {len(members)} formulas", file=sys.stderr)
+    if not args.smt_id:
+        for m in members.values(): print(m.name)
+        sys.exit(0)
+    for smt_id in args.smt_id:
+        if smt_id not in members:
+            print(f"SMT-id {smt_id} not found in {path}", file=sys.stderr); sys.exit(1)
+        data = tar.extractfile(members[smt_id]).read()
+        if args.output:
+            os.makedirs(args.output, exist_ok=True)
+            with open(os.path.join(args.output, members[smt_id].name), 'wb') as f: f.write(data)
+        else:
+            sys.stdout.write(data.decode())
@@ -1,6 +1,13 @@
 #!/usr/bin/env python3
-import os, subprocess, unittest
+import multiprocessing, os, pickle, shutil, subprocess, tarfile, tempfile, threading, time, types, unittest
 import conbyte.explore
+from conbyte.archive import FormulaArchive
+from conbyte.cache import QueryCache
+from conbyte.concolic import Node
+from conbyte.evaluator import evaluate
+from conbyte.solver import Solver
+from conbyte.utils import parse_smt, py2smt, sexpr2py, smt2py
+from conbyte.zygote import Zygote
 
 class TestCodeSnippets(unittest.TestCase):
     dump = bool(os.environ.get('dump', False))
@@ -110,3 +117,166 @@ class TestCodeSnippets(unittest.TestCase):
     def assert_equal(self, iteration, a, b):
         if iteration == self.iteration_max: self.assertEqual(a, b)
         return a == b
+
+class TestQueryCache(unittest.TestCase):
+    def test_string_constants(self): # whitespaces inside string constants are significant, so these two (unsat and sat) queries must not share an entry
+        var_to_types = {'s_python': 'String'}
+        unsat = Solver._canonicalize(var_to_types, ['(assert (not (str.contains s_python " ")))', '(assert (str.contains s_python "  "))'])[0]
+        sat = Solver._canonicalize(var_to_types, ['(assert (not (str.contains s_python "  ")))', '(assert (str.contains s_python " "))'])[0]
+        self.assertNotEqual(QueryCache.key(['cvc4'], unsat), QueryCache.key(['cvc4'], sat))
+
+    def test_whitespaces(self): # whitespaces outside string constants are not
+        self.assertEqual(QueryCache.key(['cvc4'], '(assert  (= x_python\n"a b"))'), QueryCache.key(['cvc4'], '( assert (= x_python "a b" ) )'))
+
+class TestFormulaArchive(unittest.TestCase):
+    def test_unclosed(self): # The formulas written so far are readable even if the archive is never closed (e.g., the run is killed).
+        with tempfile.TemporaryDirectory() as d:
+            archive = FormulaArchive(os.path.join(d, 'formula.tar.gz')); names = [f'{i}_sat.smt2' for i in range(1, 4)]
+            for name in names: archive.add(name, f'(assert (= x_python {name[0]}))\n')
+            deadline = time.time() + 10
+            while self._names(archive.path) != names and time.time() < deadline: time.sleep(0.01)
+            self.assertEqual(self._names(archive.path), names)
+            archive.close()
+            with tarfile.open(archive.path, 'r:gz') as tar: self.assertEqual(tar.extractfile('2_sat.smt2').read(), b'(assert (= x_python 2))\n')
+
+    @staticmethod
+    def _names(path):
+        names = []
+        try:
+            with tarfile.open(path, 'r:gz') as tar:
+                for m in tar: names.append(m.name)
+        except (EOFError, OSError, tarfile.ReadError): pass
+        return names
+
+class TestEvaluator(unittest.TestCase):
+    # The evaluator decides whether the solver is skipped, so it must agree with the solver on the corner cases of SMT-LIB2.
+    cases = [('(div (- 7) 2)', '(- 4)'), ('(mod (- 7) 2)', '1'), ('(div (- 7) (- 2))', '4'), ('(mod (- 7) (- 2))', '1'), ('(div 7 (- 2))', '(- 3)'), ('(mod 7 (- 2))', '1'), # Euclidean
+             ('(str.replace "abc" "" "x")', '"xabc"'), ('(str.replace "abcb" "b" "")', '"acb"'), ('(str.replace_all "abc" "" "x")', '"abc"'), ('(str.replace_all "abcb" "b" "x")', '"axcx"'),
+             ('(str.indexof "abc" "" 1)', '1'), ('(str.indexof "abc" "" 3)', '3'), ('(str.indexof "abc" "" 4)', '(- 1)'), ('(str.indexof "abc" "a" (- 1))', '(- 1)'), ('(str.indexof "abcabc" "c" 3)', '5'),
+             ('(str.substr "abc" 1 5)', '"bc"'), ('(str.substr "abc" 3 1)', '""'), ('(str.substr "abc" (- 1) 2)', '""'), ('(str.substr "abc" 1 (- 1))', '""'), ('(str.at "abc" 3)', '""'), ('(str.at "abc" (- 1))', '""'),
+             ('(str.to_int "")', '(- 1)'), ('(str.to_int "012")', '12'), ('(str.to_int "-1")', '(- 1)'), ('(str.from_int (- 3))', '""'), ('(str.to_code "ab")', '(- 1)'), ('(str.from_code 196608)', '""'),
+             ('(str.len "a""b")', '3'), ('(str.len "\\u{48}")', '1'), ('(str.< "ab" "b")', 'true'), ('(str.in_re "ab" (re.+ (re.range "a" "b")))', 'true')]
+
+    def test_semantics(self):
+        for (expr, expected) in self.cases:
+            with self.subTest(expr=expr): self.assertEqual(evaluate(parse_smt(expr)[0], {}), evaluate(parse_smt(expected)[0], {}))
+
+    @unittest.skipUnless(shutil.which('cvc4'), "cvc4 not found")
+    def test_semantics_against_solver(self): # the evaluator and the solver agree if every negated equality is unsat
+        formulas = "".join(f"(push 1)\n(assert (not (= {expr} {expected})))\n(check-sat)\n(pop 1)\n" for (expr, expected) in self.cases)
+        outputs = subprocess.run(["cvc4", "--lang", "smt", "--quiet", "--strings-exp", "--incremental"], input=formulas.encode(), capture_output=True).stdout.decode().split()
+        self.assertEqual(list(zip(self.cases, outputs)), [(case, 'unsat') for case in self.cases])
+
+    def test_escapes(self):
+        self.assertEqual(smt2py('"\\u{48}\\u0049\\x4a"'), 'HIJ')
+        self.assertEqual(smt2py('"a""b"'), 'a"b')
+        self.assertEqual(smt2py('"\\n\\t\\\\"'), '\n\t\\')
+        for s in ('', '"', '""', '\\', '\\n', '\n\r\t', 'caf\u00e9 \U0001f600', '\\u{48}'):
+            with self.subTest(s=s): self.assertEqual(smt2py(py2smt(s)), s)
+
+class TestModelParser(unittest.TestCase):
+    def test_parse_smt(self):
+        self.assertEqual(parse_smt('((x_python (- 5)) (s_python "") (t_python "a"")b"))'), [[['x_python', ['-', '5']], ['s_python', '""'], ['t_python', '"a"")b"']]])
+        self.assertEqual(parse_smt('((a_python 1)\n (b_python "("))\n((c_python true))'), [[['a_python', '1'], ['b_python', '"("']], [['c_python', 'true']]]) # one line for each variable
+        self.assertEqual(parse_smt('((r_python (/ 1 (- 2))))'), [[['r_python', ['/', '1', ['-', '2']]]]])
+        for x in ('((x_python 1)', '(x_python 1))'):
+            with self.subTest(x=x): self.assertRaises(ValueError, parse_smt, x)
+
+    def test_sexpr2py(self):
+        self.assertEqual(sexpr2py(['-', '5']), -5)
+        self.assertEqual(sexpr2py(['-', '2.5']), -2.5)
+        self.assertEqual(sexpr2py(['/', '1', ['-', '2']]), -0.5)
+        self.assertEqual(sexpr2py('""'), '')
+        self.assertEqual(sexpr2py('"a""b\\u{48}"'), 'a"bH')
+        self.assertRaises(NotImplementedError, sexpr2py, [['_', 'bv', '1'], 'x'])
+
+    def test_get_model(self): # the responses of one batched get-value
+        engine = types.SimpleNamespace(var_to_types={'i_python': 'Int', 'b_python': 'Bool', 'r_python': 'Real', 's_python': 'String', 't_python': 'String'})
+        self.assertEqual(Solver._get_model(engine, ['((i_python (- 5)) (b_python false) (r_python (/ (- 3) 2)) (s_python "") (t_python " (""\\u{e9}"")"))']),
+                         {'i': -5, 'b': False, 'r': -1.5, 's': '', 't': ' ("\u00e9")'})
+
+class TestNode(unittest.TestCase):
+    def test_pickle(self): # Equality is identity, so a loaded node must be interned again.
+        node = Node.make('<', Node.make('+', 'x_python', '1'), '3')
+        loaded = pickle.loads(pickle.dumps(node, pickle.HIGHEST_PROTOCOL))
+        self.assertIs(loaded, node); self.assertIs(loaded[1], node[1])
+        self.assertIs(pickle.loads(pickle.dumps(Node.make('str.len', 's_python'))), Node.make('str.len', 's_python'))
+
+    def test_prune(self): # Only the nodes referred to by nothing but the table are dropped.
+        kept = Node.make('=', Node.make('str.++', 's_python', '"a"'), '"b"'); dropped = Node.make('not', Node.make('distinct', 'y_python', '2'))
+        del dropped; Node.prune()
+        self.assertNotIn(('distinct', 'y_python', '2'), Node.table) # together with its parent
+        self.assertIn(('str.++', 's_python', '"a"'), Node.table)
+        self.assertIs(Node.make('=', Node.make('str.++', 's_python', '"a"'), '"b"'), kept)
+
+class TestZygote(unittest.TestCase):
+    def test_children(self): # A child is killed and reaped by the zygote, which then tells us it has exited.
+        def serve(prepared, request, conns):
+            conns[0].send((prepared, os.getpid()))
+            if request == 'hang': time.sleep(100)
+        zygote = Zygote(lambda: 'prepared', serve); pids = []
+        try:
+            for request in ('return', 'hang', 'return', 'hang', 'hang'): # The last two are left to the next fork and to close().
+                (r, s) = multiprocessing.Pipe(); child = zygote.fork(request, [s])
+                (prepared, pid) = r.recv(); pids.append(pid); self.assertEqual(prepared, 'prepared')
+                if request == 'return':
+                    while child.is_alive(): time.sleep(0.01)
+                elif len(pids) == 2:
+                    self.assertTrue(child.is_alive()); child.kill(); self.assertFalse(child.is_alive())
+        finally: zygote.close()
+        self.assertEqual(len(set(pids)), len(pids))
+        for pid in pids: self.assertRaises(ProcessLookupError, os.kill, pid, 0) # all reaped
+
+class TestPortfolio(unittest.TestCase):
+    class Session: # answers after the given delay unless interrupted
+        def __init__(self, delay, outputs): self.delay = delay; self.outputs = outputs; self.event = threading.Event(); self.cancelled = False
+        def query(self, *args): return [] if self.event.wait(self.delay) else self.outputs
+        def interrupt(self): self.event.set()
+
+    def test_winner(self): # Only the second configuration answers quickly, so it must be reported as the winner.
+        (latency, portfolio_wins, timeout) = (getattr(Solver, 'latency', {}), getattr(Solver, 'portfolio_wins', {}), getattr(Solver, 'timeout', 10))
+        Solver.latency = {}; Solver.portfolio_wins = {}; Solver.timeout = 10
+        try:
+            sessions = [self.Session(5, ['unknown']), self.Session(0.05, ['sat', '((x_python 1))']), self.Session(5, ['unsat'])]
+            self.assertEqual(Solver._race(sessions, 'kind', {}, ['(assert true)'], '', None, None), (['sat', '((x_python 1))'], 1))
+            self.assertTrue(sessions[0].event.is_set() and sessions[2].event.is_set()) # the others are interrupted
+        finally: (Solver.latency, Solver.portfolio_wins, Solver.timeout) = (latency, portfolio_wins, timeout)
+
+class TestNativeProcedure(unittest.TestCase):
+    def test_verdicts(self): # Under --safety, every verdict of the native procedure on these integer targets is also checked against the solver.
+        native_number = 0
+        for (root, modpath, inputs) in [("test", "do_abs", {'a':0, 'b':0}), ("test", "do_numbers", {'a':0, 'b':0}), ("test", "loop", {'a':0, 'b':0}),
+                                        ("test/targets/leetcode", "add_digits", {'num':0}), ("test/targets/leetcode", "reverseCheck", {'number':0}), ("test/targets/leetcode", "ugly_number", {'num':0})]:
+            with self.subTest(modpath=modpath):
+                engine = conbyte.explore.ExplorationEngine(safety=1)
+                self.assertGreater(engine.explore(modpath, inputs, root=root), 0) # more than one iteration, i.e., the exploration has not been aborted
+                self.assertEqual(Solver.stats['native_mismatch_number'], 0); native_number += Solver.stats['native_number']
+        self.assertGreater(native_number, 0) # some verdicts have actually been checked
+
+class TestModes(unittest.TestCase):
+    # Each of these modes only changes how the exploration is carried out, so it must find the same inputs (in any order) and the same coverage as the default run.
+    targets = [("test", "do_numbers", {'a':0, 'b':0}), ("test/strings", "string_find", {'a':'', 'b':''}), ("test/targets/leetcode", "numDecodings", {'s':''}), ("test/target_int/leetcode_int", "validWordAbbreviation", {'word':'', 'abbr':''})]
+    default = {} # modpath -> the result of the default run, shared by all tests
+
+    def test_share_prefix(self): self._assert_same({'share_prefix': True})
+    def test_solver_jobs(self): self._assert_same({'solver_jobs': 3})
+    def test_portfolio(self): self._assert_same({'portfolio': ['--strings-exp', '--strings-exp --strings-fmf']}, same_inputs=False) # Another configuration may win and give another model.
+    def test_zygote(self): self._assert_same({}, {'zygote': True})
+    def test_single_pass(self): self._assert_same({}, {'single_pass': True})
+    def test_cross_check(self): self._assert_same({}, {'single_pass': True, 'cross_check': 2}) # the primitive mode (every other input) asserts the results are the same
+    def test_zygote_single_pass(self): self._assert_same({}, {'zygote': True, 'single_pass': True})
+
+    def _assert_same(self, engine_options={}, explore_options={}, *, same_inputs=True):
+        for (root, modpath, inputs) in self.targets:
+            with self.subTest(modpath=modpath):
+                if modpath not in self.default: self.default[modpath] = self._explore(root, modpath, inputs, {}, {})
+                self.assertGreater(len(self.default[modpath][0]), 1); self.assertGreater(self.default[modpath][1][1], 0) # or both runs may have failed in the same way
+                (in_out, coverage) = self._explore(root, modpath, inputs, engine_options, explore_options)
+                self.assertEqual(coverage, self.default[modpath][1])
+                if same_inputs: self.assertEqual(in_out, self.default[modpath][0])
+
+    @staticmethod
+    def _explore(root, modpath, inputs, engine_options, explore_options):
+        engine = conbyte.explore.ExplorationEngine(**engine_options)
+        engine.explore(modpath, inputs.copy(), root=root, **explore_options)
+        return sorted(map(repr, engine.in_out)), engine.coverage_statistics()
@@ -15,21 +15,28 @@ parser.add_argument("-r", "--root", dest="root", help="path to the project root
 parser.add_argument("-s", "--func", dest="func", help="name of the target function\n(*) If the function \"func\" belongs to a class \"CLASS\", this name should be \"CLASS.func\".\n(*) If the function name is the same as that of the target file, this option can be omitted.", default=None)
 parser.add_argument("-m", "--iter", dest="iter", help="maximum number of iterations [default = 200]", type=int, default=200)
 parser.add_argument("--lib", dest="lib", help="another library path to be inserted at the beginning of sys.path\nFor example, if the target function belongs to another project requiring a virtual environment,\nyou may want to do \"--lib ~/.local/share/virtualenvs/projectname-projectid/lib/python3.8/site-packages\".", default=None)
-parser.add_argument("--safety", dest="safety", help="indicates the behavior when the values in Python and in SMTLIB2 of a concolic object are not equal. [default = 0]\n(0) The expression in a concolic object is still preserved even if the values are different.\n(1) The expression in a concolic object will be erased if the values are different, but the program still continues.\n(2) The expression in a concolic object will be erased if the values are different, and the program exits soon.\nOnly in level 0 don't we verify return values of the target function since some objects in fact are not picklable,\nand therefore information about return values will not printed in the end.", type=int, default=0)
+parser.add_argument("--safety", dest="safety", help="indicates the behavior when the values in Python and in SMTLIB2 of a concolic object are not equal. [default = 0]\n(0) The expression in a concolic object is still preserved even if the values are different.\n(1) The expression in a concolic object will be erased if the values are different, but the program still continues.\n(2) The expression in a concolic object will be erased if the values are different, and the program exits soon.\nOnly in level 0 don't we verify return values of the target function since some objects in fact are not picklable,\nand therefore information about return values will not printed in the end.\nIn levels 1 and 2, the constraints decided without the solver are also checked against the solver.", type=int, default=0)
 parser.add_argument("-t", "--timeout", dest="timeout", help="timeout (sec.) for the solver to solve a constraint [default = 10]", type=int, default=10)
 parser.add_argument("--single_timeout", dest="single_timeout", help="timeout (sec.) for the explorer to go through one iteration [default = 15]", type=int, default=15)
 parser.add_argument("--total_timeout", dest="total_timeout", help="", type=int, default=900)
+parser.add_argument("--zygote", dest="zygote", action='store_true', help="import the target module only once for each of the concolic and primitive modes.\nEach execution then takes place in a child forked from the process which has imported it, rather than\nin a fresh process importing it again. This helps a lot when the target module has heavy imports.")
+parser.add_argument("--single_pass", dest="single_pass", action='store_true', help="measure the line coverage of the target file during the concolic execution itself.\nThe target is then not executed again in the primitive mode, except for the cross-check below.")
+parser.add_argument("--cross_check", dest="cross_check", help="in the single-pass mode, also execute every N-th input in the primitive mode to check the result\nof the concolic execution [default = 0 (never)]", type=int, default=0)
 parser.add_argument("--include_exception", dest="include_exception", action='store_true', help="update coverage statistics also when the return value is not picklable.")
 
 # Logging configuration
 parser.add_argument("-v", "--verbose", dest='verbose', help="logging level [default = 1]\n(0) Show messages whose levels not lower than WARNING.\n(1) Show messages from (0), plus basic iteration information.\n(2) Show messages from (1), plus solver information.\n(3) Show messages from (2), plus all concolic objects' information.", type=int, default=1)
 parser.add_argument("-l", "--logfile", dest='logfile', help="name of the log file\n(*) When this argument is an empty string, all logging messages will not be dumped either to screens or to files.\n(*) When this option is not set, the logging messages will be dumped to screens.", default=None)
-parser.add_argument("-d", "--formula", dest='formula', help="name of directory or file to store smtlib2 formulas\n(*) When this argument is a pure positive integer N, it means that we only want to store the N_th constraint\nwhere N is the number \"SMT-id\" shown in the log. The file should be named {N}.smt2 in the current directory.\n(*) Otherwise, this argument names the directory, and all constraints will be stored in this directory whose\nnames follow the rule mentioned above.\nIn either case, these *.smt2 files should be able to be called by a solver directly.", default=None)
-parser.add_argument("--dump_projstats", dest="dump_projstats", action='store_true', help="dump project statistics under the directory \"./project_statistics/{project_name}/{path.to.module}/{func_name}/**\".")
+parser.add_argument("-d", "--formula", dest='formula', help="name of directory or file to store smtlib2 formulas\n(*) When this argument is a pure positive integer N, it means that we only want to store the N_th constraint\nwhere N is the number \"SMT-id\" shown in the log. The file should be named {N}.smt2 in the current directory.\n(*) Otherwise, this argument names the directory, and all constraints will be stored in the archive \"formula.tar.gz\"\nin this directory whose member names follow the rule mentioned above. They can be extracted by \"./extract_formula.py DIR N\".\nIn either case, these *.smt2 files should be able to be called by a solver directly.", default=None)
+parser.add_argument("--dump_projstats", dest="dump_projstats", action='store_true', help="dump project statistics under the directory \"./project_statistics/{project_name}/{path.to.module}/{func_name}/**\".\nThe record of each solver query is written to \"queries.jsonl\" there, which can be summarized by \"./summarize_queries.py\".")
 
 # Solver configuration
 # solver=[z3seq, z3str, trauc, cvc4]
 parser.add_argument("--solver", dest='solver', help="solver type [default = cvc4]\nWe currently only support CVC4.", default="cvc4")
+parser.add_argument("--share_prefix", dest='share_prefix', action='store_true', help="keep the common prefix of consecutive constraints asserted in the solver session.\nEach assertion of a constraint path is pushed at its own level, so the next constraint only pops to\nthe common ancestor of both constraints and pushes the remaining assertions.")
+parser.add_argument("--solver-jobs", dest='solver_jobs', help="number of solver processes working in parallel [default = 1]\nThe first N constraints in the queue are solved at once, and their models are then executed in the queue order.", type=int, default=1)
+parser.add_argument("--portfolio", dest='portfolio', help="solver options of each configuration in the portfolio, separated by commas [default = \"--strings-exp\"]\nAll configurations race on every query, the first definitive answer is taken, and the others are killed.\nThe configuration which has won the most similar queries is given a head start. Please pass the value with \"=\",\ne.g., --portfolio=\"--strings-exp,--strings-exp --strings-fmf\".", default=None)
+parser.add_argument("--query_cache", dest='query_cache', help="directory of the solver query cache shared across runs [default = None (disabled)]\nThe answer of each formula sent to the solver is stored there and reused by later runs (or other processes).", default=None)
 
 # Parse arguments
 args = parser.parse_args()
@@ -40,10 +47,12 @@ funcname = t if (t:=args.func) else args.modpath.split('.')[-1]
 statsdir = os.path.abspath(os.path.dirname(__file__)) + '/project_statistics/' + os.path.abspath(args.root).split('/')[-1] + '/' + args.modpath + '/' + funcname if args.dump_projstats else None
 engine = conbyte.explore.ExplorationEngine(solver=args.solver, timeout=args.timeout, safety=args.safety,
                                            store=args.formula, verbose=args.verbose, logfile=args.logfile,
-                                           statsdir=statsdir)
+                                           statsdir=statsdir, share_prefix=args.share_prefix, solver_jobs=args.solver_jobs,
+                                           query_cache=args.query_cache, portfolio=args.portfolio.split(',') if args.portfolio else None)
 print("\nTotal iterations:", engine.explore(args.modpath, eval(args.input), root=args.root, funcname=args.func,
                                             max_iterations=args.iter, single_timeout=args.single_timeout, total_timeout=args.total_timeout, deadcode=set(),
-                                            include_exception=args.include_exception, lib=args.lib))
+                                            include_exception=args.include_exception, lib=args.lib, zygote=args.zygote,
+                                            single_pass=args.single_pass, cross_check=args.cross_check))
 ##############################################################################
 
 ################################################################
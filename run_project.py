@@ -45,6 +45,7 @@ def extract_function_list_from_modpath(rootdir, modpath):
     print()
     return ans
 
+query_cache = f" --query_cache '{os.path.abspath(args.query_cache)}'" if args.query_cache else '' # opt-in, since cached answers would skew the time measured against pyexz3
 cont = False
 start = time.time()
 try:
@@ -56,9 +57,9 @@ try:
                 if not modpath.startswith('.venv') and '__pycache__' not in modpath:
                     # if 'solutions.system_design.mint.mint_mapreduce' not in modpath: continue #cont = True
                     # if not cont: continue
-                    if args.mode == '1': cmd = f"./py-conbyte.py -r '{rootdir}' '{modpath}' --total_timeout {TOTAL_TIMEOUT} {{}} -m {args.iteration} --lib '{lib}' --include_exception --dump_projstats"
+                    if args.mode == '1': cmd = f"./py-conbyte.py -r '{rootdir}' '{modpath}' --total_timeout {TOTAL_TIMEOUT} {{}} -m {args.iteration} --lib '{lib}' --include_exception --dump_projstats{query_cache}"
                     elif args.mode == '2': cmd = f"./pyexz3.py -r '{rootdir}' '{modpath}' --total_timeout {TOTAL_TIMEOUT} {{}} -m {args.iteration} --lib '{lib}' --dump_projstats"
-                    else: cmd = f"./py-conbyte.py -r '{rootdir}' '{modpath}' --total_timeout {TOTAL_TIMEOUT} {{}} -m 1 --lib '{lib}' --include_exception --dump_projstats"
+                    else: cmd = f"./py-conbyte.py -r '{rootdir}' '{modpath}' --total_timeout {TOTAL_TIMEOUT} {{}} -m 1 --lib '{lib}' --include_exception --dump_projstats{query_cache}"
                     if os.fork() == 0: # child process
                         funcs = extract_function_list_from_modpath(rootdir, modpath)
                         for f in funcs:
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+import argparse, collections, json, os
+
+# This script summarizes the per-query records "queries.jsonl" dumped by "--dump_projstats".
+f = argparse.RawTextHelpFormatter._split_lines
+argparse.RawTextHelpFormatter._split_lines = lambda *args, **kwargs: f(*args, **kwargs) + ['']
+parser = argparse.ArgumentParser(formatter_class=argparse.RawTextHelpFormatter)
+parser.add_argument("path", nargs='*', help="files \"queries.jsonl\", or directories to be searched for them [default = ./project_statistics]", default=['./project_statistics'])
+parser.add_argument("-n", "--worst", dest="worst", help="number of the slowest queries to be listed [default = 10]", type=int, default=10)
+args = parser.parse_args()
+
+records = []
+for path in args.path:
+    files = [path] if os.path.isfile(path) else [os.path.join(dirpath, 'queries.jsonl') for (dirpath, _, filenames) in os.walk(path) if 'queries.jsonl' in filenames]
+    for file in sorted(files):
+        with open(file, 'r') as f:
+            for line in f:
+                if line.strip(): records.append(dict(json.loads(line), file=os.path.dirname(file)))
+if not records: print("No query records found."); exit(0)
+
+def histogram(title, key, bounds, unit):
+    ##########################################################################################
+    # Each bucket counts the records whose values are less than its bound (and not less than
+    # the previous one), and also sums up their time, so that we can see where time is spent.
+    buckets = [[0, 0] for _ in range(len(bounds) + 1)]
+    for r in records:
+        b = buckets[next((i for (i, bound) in enumerate(bounds) if r[key] < bound), len(bounds))]; b[0] += 1; b[1] += r['time']
+    print(f"\n{title}")
+    labels = [f"< {bound}{unit}" for bound in bounds] + [f">= {bounds[-1]}{unit}"]
+    for (label, (number, time)) in zip(labels, buckets):
+        print(f"  {label:>12} {number:7} {time:10.2f}s  " + '#' * round(50 * number / len(records)))
+
+def table(title, key):
+    groups = collections.defaultdict(lambda: [0, 0])
+    for r in records: g = groups[key(r)]; g[0] += 1; g[1] += r['time']
+    print(f"\n{title}")
+    for (name, (number, time)) in sorted(groups.items(), key=lambda item: -item[1][1]):
+        print(f"  {name:>32} {number:7} {time:10.2f}s")
+
+print(f"{len(records)} queries, {sum(r['time'] for r in records):.2f}s in total")
+table("By source", lambda r: r['source'])
+table("By status", lambda r: r['status'])
+table("By theories", lambda r: '+'.join(r['theories']))
+histogram("Wall time", 'time', [0.001, 0.01, 0.1, 1, 10], 's')
+histogram("Formula size", 'bytes', [256, 1024, 4096, 16384, 65536], 'B')
+histogram("Number of assertions", 'assertions', [2, 4, 8, 16, 32, 64], '')
+histogram("Constraint depth", 'depth', [2, 4, 8, 16, 32, 64], '')
+
+print(f"\nThe {args.worst} slowest queries")
+for r in sorted(records, key=lambda r: -r['time'])[:args.worst]:
+    print(f"  {r['time']:8.3f}s  SMT-id {r['smt_id']}  {r['status']:>7}  {r['source']:>11}  {r['assertions']} assertions  {r['bytes']}B  {'+'.join(r['theories'])}  {r['file']}")
@@ -5,7 +5,7 @@ def SIGINT_handler(signum, frame):
     sys.exit(0)
 signal.signal(signal.SIGINT, SIGINT_handler)
 
-parser = argparse.ArgumentParser(); parser.add_argument("mode"); parser.add_argument("project"); parser.add_argument("-i", "--iteration"); args = parser.parse_args()
+parser = argparse.ArgumentParser(); parser.add_argument("mode"); parser.add_argument("project"); parser.add_argument("-i", "--iteration"); parser.add_argument("-q", "--query_cache", default=None); args = parser.parse_args()
 
 if args.mode != '2':
     from conbyte.utils import get_module_from_rootdir_and_modpath